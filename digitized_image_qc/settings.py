@@ -89,6 +89,20 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "cache",
+        "OPTIONS": {
+            "MAX_ENTRIES": int(getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -135,14 +149,64 @@ X_FRAME_OPTIONS = "SAMEORIGIN"
 
 BASE_STORAGE_DIR = BASE_DIR / getenv('STORAGE_PATH')
 
+# Rejected packages are renamed into the quarantine directory, so it must be on
+# the same filesystem as the storage directory. Hidden directories in the
+# storage directory are not treated as packages.
+QUARANTINE_DIR = BASE_DIR / getenv('QUARANTINE_PATH', BASE_STORAGE_DIR / '.quarantine')
+QUARANTINE_RETENTION_DAYS = int(getenv('QUARANTINE_RETENTION_DAYS', 7))
+
+THUMBNAILS = {
+    'cache_dir': BASE_DIR / getenv('THUMBNAIL_CACHE_PATH', 'thumbnails'),
+    'size': int(getenv('THUMBNAIL_SIZE', 300)),
+    'max_cache_size': int(getenv('THUMBNAIL_CACHE_MAX_SIZE', 1024 ** 3))
+}
+
+# Expectations against which the technical metadata of images are checked during discovery.
+# Mismatches are flagged at the given level (warn or fail); checks with an expected value of None are skipped.
+QC_CHECKS = {
+    'min_dpi': {'expected': int(getenv('QC_MIN_DPI', 400)), 'level': 'fail'},
+    'min_long_edge': {'expected': None, 'level': 'warn'},
+    'bit_depths': {'expected': [8, 16], 'level': 'fail'},
+    'compressions': {'expected': ['raw', 'tiff_lzw', 'tiff_adobe_deflate'], 'level': 'warn'},
+    'icc_profile': {'expected': True, 'level': 'warn'},
+}
+
+FIXITY = {
+    'algorithm': getenv('FIXITY_ALGORITHM', 'sha256'),
+}
+
+# Thresholds at which pages are flagged by image analysis.
+IMAGE_ANALYSIS = {
+    'size': 512,
+    'batch_size': 16,
+    'blank_max_std': 6,
+    'dark_max_mean': 40,
+    'max_skew': float(getenv('ANALYSIS_MAX_SKEW', 1)),
+    'max_clipping': float(getenv('ANALYSIS_MAX_CLIPPING', 5)),
+}
+
+TILES = {
+    'cache_dir': BASE_DIR / getenv('TILE_CACHE_PATH', 'tiles'),
+    'tile_size': 256,
+    'max_cache_size': int(getenv('TILE_CACHE_MAX_SIZE', 10 * 1024 ** 3))
+}
+
 MEDIA_ROOT = BASE_STORAGE_DIR
 MEDIA_URL = '/media/'
+# Header used to hand media delivery to the web server, e.g. X-Sendfile for Apache with mod_xsendfile
+MEDIA_SENDFILE_HEADER = getenv('MEDIA_SENDFILE_HEADER')
 
 AQUILA = {
     'baseurl': getenv('AQUILA_BASEURL')
 }
 
+ARCHIVESSPACE = {
+    'cache_timeout': int(getenv('AS_CACHE_TIMEOUT', 86400))
+}
+
 AWS = {
     'role_arn': getenv('AWS_ROLE_ARN'),
-    'sns_topic': getenv('AWS_SNS_TOPIC')
+    'sns_topic': getenv('AWS_SNS_TOPIC'),
+    'config_cache_timeout': int(getenv('AWS_CONFIG_CACHE_TIMEOUT', 300)),
+    'max_pool_connections': int(getenv('AWS_MAX_POOL_CONNECTIONS', 10))
 }
@@ -14,14 +14,17 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import re_path
 
-from package_review.views import (PackageApproveView, PackageBulkApproveView,
+from package_review.views import (JobDetailView, PackageApproveView,
+                                  PackageBulkApproveView,
+                                  PackageBulkRefreshView,
                                   PackageBulkRejectView,
                                   PackageDataRefreshView, PackageDetailView,
-                                  PackageListView, PackageRejectView)
+                                  PackageFileThumbnailView,
+                                  PackageFileTileView, PackageFileZoomView,
+                                  PackageListView, PackageMediaView,
+                                  PackageRejectView)
 
 urlpatterns = [
     # path("admin/", admin.site.urls),
@@ -32,4 +35,10 @@ urlpatterns = [
     re_path(r'^package/approve/', PackageApproveView.as_view(), name='package-approve'),
     re_path(r'^package/reject/', PackageRejectView.as_view(), name='package-reject'),
     re_path(r'^package/refresh-data/', PackageDataRefreshView.as_view(), name='refresh-data'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    re_path(r'^package/bulk-refresh-data/$', PackageBulkRefreshView.as_view(), name='bulk-refresh-data'),
+    re_path(r'^file/(?P<pk>[\d]+)/thumbnail/$', PackageFileThumbnailView.as_view(), name='file-thumbnail'),
+    re_path(r'^file/(?P<pk>[\d]+)/zoom/$', PackageFileZoomView.as_view(), name='file-zoom'),
+    re_path(r'^file/(?P<pk>[\d]+)/tiles/(?P<level>[\d]+)/(?P<column>[\d]+)/(?P<row>[\d]+)\.jpg$', PackageFileTileView.as_view(), name='file-tile'),
+    re_path(r'^job/(?P<pk>[\d]+)/$', JobDetailView.as_view(), name='job-detail'),
+    re_path(r'^media/(?P<refid>[\w]+)/(?P<path>.+)$', PackageMediaView.as_view(), name='package-media'),
+]
@@ -4,6 +4,10 @@
 echo "Apply database migrations"
 python manage.py migrate
 
+# Create cache table
+echo "Create cache table"
+python manage.py createcachetable
+
 #Start server
 echo "Starting server"
 python manage.py runserver 0.0.0.0:${APPLICATION_PORT}
\ No newline at end of file
@@ -7,6 +7,8 @@ declare -p | grep -Ev 'BASHOPTS|BASH_VERSINFO|EUID|PPID|SHELLOPTS|UID' > /contai
 
 # run app migrations
 python ./manage.py migrate
+# create cache table
+python ./manage.py createcachetable
 # collect static assets
 python ./manage.py collectstatic --no-input
 # discover packages
@@ -19,5 +21,13 @@ python ./manage.py send_startup_message
 # start cron
 cron
 
+# watch for new packages, restarting the watcher if it exits
+(
+    while true; do
+        python -u ./manage.py discover_packages --watch --workers 4
+        sleep 5
+    done
+) &
+
 # start Apache
 apache2ctl -D FOREGROUND
\ No newline at end of file
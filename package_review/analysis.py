@@ -0,0 +1,147 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from .images import get_fingerprint, to_8bit
+from .models import PackageFile
+
+SKEW_ANGLES = np.arange(-5, 5.25, 0.25)
+
+
+def load_page(source, size):
+    """Returns a greyscale array of an image, downsampled so its long edge is at most size pixels."""
+    with Image.open(source) as image:
+        image = to_8bit(image).convert('L')
+        image.thumbnail((size, size), reducing_gap=2.0)
+        return np.asarray(image, dtype=np.uint8)
+
+
+def get_page_statistics(pages):
+    """Computes brightness statistics for a batch of pages at once.
+
+    Pages are flattened into a single array and reduced per page, so the cost
+    of a batch is a handful of vectorized passes regardless of its length.
+
+    Args:
+        pages (list): 2-dimensional uint8 arrays of greyscale pixel values.
+
+    Returns:
+        statistics (list): dicts containing the mean and standard deviation of
+            pixel values, and the percentage of pixels clipped to black or white,
+            for each page.
+    """
+    sizes = np.array([page.size for page in pages])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    pixels = np.concatenate([page.ravel() for page in pages])
+    values = pixels.astype(np.float64)
+    means = np.add.reduceat(values, offsets) / sizes
+    variances = np.maximum(np.add.reduceat(values ** 2, offsets) / sizes - means ** 2, 0)
+    black_clipping = np.add.reduceat((pixels <= 2).astype(np.int64), offsets) / sizes * 100
+    white_clipping = np.add.reduceat((pixels >= 253).astype(np.int64), offsets) / sizes * 100
+    return [
+        {'mean': round(float(mean), 2), 'std': round(float(std), 2), 'black_clipping': round(float(black), 2), 'white_clipping': round(float(white), 2)}
+        for mean, std, black, white in zip(means, np.sqrt(variances), black_clipping, white_clipping)]
+
+
+def estimate_skew(page, angles=SKEW_ANGLES, max_points=50000):
+    """Estimates the skew of a page in degrees using projection profiles.
+
+    Dark pixels are projected onto the vertical axis after shearing them by
+    each candidate angle. Lines of text produce the sharpest profile (the
+    largest sum of squared row counts) when the shear cancels out the skew.
+    All angles are evaluated in a single vectorized pass.
+
+    Returns:
+        skew (float): estimated skew, or None if the page has too little content.
+    """
+    threshold = min(float(page.mean()) - float(page.std()), 128)
+    ys, xs = np.nonzero(page < threshold)
+    if len(ys) < 100:
+        return None
+    step = max(len(ys) // max_points, 1)
+    ys, xs = ys[::step], xs[::step]
+    shifted = np.rint(ys[np.newaxis, :] - xs[np.newaxis, :] * np.tan(np.radians(angles))[:, np.newaxis]).astype(np.int64)
+    shifted -= shifted.min()
+    height = int(shifted.max()) + 1
+    index = shifted + np.arange(len(angles))[:, np.newaxis] * height
+    profiles = np.bincount(index.ravel(), minlength=len(angles) * height).reshape(len(angles), height)
+    scores = (profiles.astype(np.float64) ** 2).sum(axis=1)
+    return float(angles[np.argmax(scores)])
+
+
+def analyse_batch(sources, size):
+    """Returns statistics and estimated skew for a batch of images."""
+    pages = [load_page(source, size) for source in sources]
+    statistics = get_page_statistics(pages)
+    for page, page_statistics in zip(pages, statistics):
+        page_statistics['skew'] = estimate_skew(page)
+    return statistics
+
+
+def analyse_images(package_files, workers=1):
+    """Analyses images which have not been analysed since they last changed.
+
+    Images are downsampled to `settings.IMAGE_ANALYSIS['size']` and analysed in
+    batches in a process pool. Results are saved on each PackageFile along with
+    the image's fingerprint, so images are only analysed again when they change.
+
+    Args:
+        package_files (list): PackageFiles for images to analyse.
+        workers (int): number of processes used to analyse images.
+
+    Returns:
+        analysed (int): number of images analysed.
+    """
+    options = settings.IMAGE_ANALYSIS
+    fingerprints = {}
+    for package_file in package_files:
+        try:
+            fingerprint = get_fingerprint(package_file.absolute_path)
+        except OSError:
+            continue
+        if not package_file.analysis or package_file.analysis.get('fingerprint') != fingerprint:
+            fingerprints[package_file] = fingerprint
+    pending = list(fingerprints)
+    batches = [pending[start:start + options['batch_size']] for start in range(0, len(pending), options['batch_size'])]
+    if not batches:
+        return 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            analyse_batch,
+            [[package_file.absolute_path for package_file in batch] for batch in batches],
+            [options['size']] * len(batches))
+        for batch, batch_results in zip(batches, results):
+            for package_file, result in zip(batch, batch_results):
+                package_file.analysis = dict(result, fingerprint=fingerprints[package_file])
+            PackageFile.objects.bulk_update(batch, ['analysis'])
+    return len(pending)
+
+
+def get_flags(result):
+    """Returns descriptions of the problems suggested by an image's analysis results."""
+    options = settings.IMAGE_ANALYSIS
+    flags = []
+    if result['std'] <= options['blank_max_std']:
+        flags.append('Near-black page' if result['mean'] <= options['dark_max_mean'] else 'Blank page')
+    elif result['mean'] <= options['dark_max_mean']:
+        flags.append('Near-black page')
+    if result['skew'] is not None and abs(result['skew']) >= options['max_skew']:
+        flags.append(f'Skewed by {abs(result["skew"]):g}°')
+    for tone in ['black', 'white']:
+        if result[f'{tone}_clipping'] >= options['max_clipping']:
+            flags.append(f'{result[f"{tone}_clipping"]:g}% of pixels clipped to {tone}')
+    return flags
+
+
+def get_analysis(package_files):
+    """Returns analysis results for PackageFiles.
+
+    Returns:
+        results (dict): analysis results and flags keyed by PackageFile, for
+            files which have been analysed.
+    """
+    return {
+        package_file: dict(package_file.analysis, flags=get_flags(package_file.analysis))
+        for package_file in package_files if package_file.analysis}
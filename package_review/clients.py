@@ -1,15 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
 import boto3
 from asnake.aspace import ASpace
+from asnake.client import ASnakeClient
 from aws_assume_role_lib import assume_role
+from botocore.config import Config
+from django.conf import settings
+from django.core.cache import cache
 from requests import Session
 
+_aws_sessions = {}
+_aws_clients = {}
+_aws_lock = Lock()
+
 
 class ArchivesSpaceClient(ASpace):
     """Client to interact with ArchivesSpace API."""
 
     def __init__(self, **kwargs):
-        super().__init__(**kwargs)
+        """Creates a client, reusing a stored session token where one is available.
+
+        ASpace.__init__ is not called, since it always logs in and fetches the
+        ArchivesSpace version before any other requests can be made.
+        """
+        self.client = ASnakeClient(**kwargs)
         self.repository = kwargs['repository']
+        self.cache_timeout = settings.ARCHIVESSPACE['cache_timeout']
+        self.session_key = f"archivesspace:session:{kwargs.get('baseurl')}:{kwargs.get('username')}"
+        self.session_token = self.saved_session_token = cache.get(self.session_key)
+        if self.session_token:
+            self.client.session.headers[self.client.config['session_header_name']] = self.session_token
+        else:
+            self.login()
+            self.save_session()
+
+    def login(self):
+        """Logs in to ArchivesSpace.
+
+        This may happen in worker threads, so the new session token is only
+        stored for reuse by other processes when `save_session` is called.
+        """
+        self.session_token = self.client.authorize()
+
+    def save_session(self):
+        """Stores the current session token for reuse by other processes, if it has changed."""
+        if self.session_token != self.saved_session_token:
+            cache.set(self.session_key, self.session_token, None)
+            self.saved_session_token = self.session_token
+
+    def _get(self, uri, **kwargs):
+        """Makes a GET request, logging in again if the stored session is no longer valid."""
+        response = self.client.get(uri, **kwargs)
+        if response.status_code in [401, 412]:
+            self.login()
+            response = self.client.get(uri, **kwargs)
+        return response
 
     def has_structured_dates(self, dates_array):
         """Parses date array to determine if structured dates are available.
@@ -30,29 +76,146 @@ class ArchivesSpaceClient(ASpace):
                 end_dates.append(date.get('end'))
         return bool(all([len(list(filter(None, start_dates))), len(list(filter(None, end_dates)))]))
 
-    def get_package_data(self, refid):
+    def _parse_package_data(self, object, resource):
+        """Parses data about an archival object and its resource.
+
+        Args:
+            object (dict): archival object data from ArchivesSpace.
+            resource (dict): data about the resource to which the archival object belongs.
+
+        Returns:
+            object_title, object_uri, resource_title, resource_uri, undated_object, already_digitized (tuple): data about the object.
+        """
+        object_uri = object['uri']
+        resource_title = resource['title']
+        resource_uri = resource['uri']
+        already_digitized = bool(len([i for i in object['instances'] if i['instance_type'] == 'digital_object']) > 0)
+        undated_object = not self.has_structured_dates(object['dates'])
+        return object['display_string'], object_uri, resource_title, resource_uri, undated_object, already_digitized
+
+    def _get_resources(self, uris, use_cache=True, workers=1):
+        """Fetch resource records, using cached copies where available.
+
+        Records are read from and written to the cache on the calling thread;
+        only the requests for uncached records are made in worker threads.
+
+        Args:
+            uris (iterable): URIs of ArchivesSpace resources.
+            use_cache (bool): whether to use cached resource records.
+            workers (int): number of threads used to fetch records.
+
+        Returns:
+            resources (dict): resource records keyed by URI.
+        """
+        uris = set(uris)
+        keys = {f'archivesspace:resource:{uri}': uri for uri in uris}
+        resources = {keys[key]: resource for key, resource in cache.get_many(keys).items()} if use_cache else {}
+        uncached = list(uris - set(resources))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            fetched = dict(zip(uncached, executor.map(lambda uri: self._get(uri).json(), uncached)))
+        cache.set_many({f'archivesspace:resource:{uri}': resource for uri, resource in fetched.items()}, self.cache_timeout)
+        resources.update(fetched)
+        return resources
+
+    def get_package_data(self, refid, use_cache=True):
         """Fetch data about an object in ArchivesSpace.
 
         Args:
             refid (string): RefID for an ArchivesSpace archival object.
+            use_cache (bool): whether to use cached ArchivesSpace records. Fetched records are cached either way.
 
         Returns:
             object_title, object_uri, resource_title, resource_uri, undated_object, already_digitized (tuple): data about the object.
         """
-        results = self.client.get(f"/repositories/{self.repository}/find_by_id/archival_objects?ref_id[]={refid}&resolve[]=archival_objects&resolve[]=archival_objects::resource").json()
+        object = cache.get(f'archivesspace:archival_object:{refid}') if use_cache else None
+        if not object:
+            results = self._get(f"/repositories/{self.repository}/find_by_id/archival_objects?ref_id[]={refid}&resolve[]=archival_objects").json()
+            try:
+                if len(results['archival_objects']) != 1:
+                    raise Exception(f'Expecting to get one result for ref id {refid} but got {len(results["archival_objects"])} instead.')
+                object = results['archival_objects'][0]['_resolved']
+            except KeyError:
+                raise Exception(f'Unable to fetch results for {refid}. Got results {results}')
+            cache.set(f'archivesspace:archival_object:{refid}', object, self.cache_timeout)
         try:
-            if len(results['archival_objects']) != 1:
-                raise Exception(f'Expecting to get one result for ref id {refid} but got {len(results["archival_objects"])} instead.')
-            object = results['archival_objects'][0]['_resolved']
-            object_uri = object['uri']
-            resource = object['resource']['_resolved']
-            resource_title = resource['title']
-            resource_uri = resource['uri']
-            already_digitized = bool(len([i for i in object['instances'] if i['instance_type'] == 'digital_object']) > 0)
-            undated_object = not self.has_structured_dates(object['dates'])
-            return object['display_string'], object_uri, resource_title, resource_uri, undated_object, already_digitized
+            resource_uri = object['resource']['ref']
+            return self._parse_package_data(object, self._get_resources([resource_uri], use_cache)[resource_uri])
         except KeyError:
-            raise Exception(f'Unable to fetch results for {refid}. Got results {results}')
+            raise Exception(f'Unable to fetch results for {refid}. Got results {object}')
+        finally:
+            self.save_session()
+
+    def _find_archival_objects(self, refids):
+        """Looks up several RefIDs in a single request.
+
+        Returns:
+            matches (dict): lists of matching archival objects keyed by RefID,
+                or the Exception raised while making the request.
+        """
+        params = {'ref_id[]': refids, 'resolve[]': ['archival_objects']}
+        try:
+            results = self._get(f"/repositories/{self.repository}/find_by_id/archival_objects", params=params).json()
+            matches = {refid: [] for refid in refids}
+            for result in results['archival_objects']:
+                object = result['_resolved']
+                matches.setdefault(object['ref_id'], []).append(object)
+            return matches
+        except Exception as e:
+            return e
+
+    def get_package_data_bulk(self, refids, batch_size=25, use_cache=True, workers=1):
+        """Fetch data about many objects in ArchivesSpace, several RefIDs per request.
+
+        Requests are made in a pool of threads, while the cache (which is stored
+        in the database) is only read and written on the calling thread.
+
+        Args:
+            refids (list): RefIDs for ArchivesSpace archival objects.
+            batch_size (int): maximum number of RefIDs to look up in a single request.
+            use_cache (bool): whether to use cached ArchivesSpace records. Fetched records are cached either way.
+            workers (int): number of threads used to make requests.
+
+        Returns:
+            package_data (dict): RefIDs mapped to either a tuple of data about the
+                object (as returned by `get_package_data`) or the Exception raised
+                while fetching it.
+        """
+        package_data = {}
+        refids = list(refids)
+        keys = {f'archivesspace:archival_object:{refid}': refid for refid in refids}
+        objects = {keys[key]: object for key, object in cache.get_many(keys).items()} if use_cache else {}
+        uncached = [refid for refid in refids if refid not in objects]
+        batches = [uncached[start:start + batch_size] for start in range(0, len(uncached), batch_size)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch, matches in zip(batches, executor.map(self._find_archival_objects, batches)):
+                if isinstance(matches, Exception):
+                    for refid in batch:
+                        package_data[refid] = Exception(f'Unable to fetch results for {refid}. Got error {matches}')
+                    continue
+                for refid in batch:
+                    if len(matches[refid]) != 1:
+                        package_data[refid] = Exception(f'Expecting to get one result for ref id {refid} but got {len(matches[refid])} instead.')
+                    else:
+                        objects[refid] = matches[refid][0]
+        cache.set_many(
+            {f'archivesspace:archival_object:{refid}': objects[refid] for refid in uncached if refid in objects},
+            self.cache_timeout)
+
+        try:
+            resources = self._get_resources([object['resource']['ref'] for object in objects.values() if 'resource' in object], use_cache, workers)
+        except Exception as e:
+            resources = {}
+            for refid in objects:
+                package_data[refid] = Exception(f'Unable to fetch resource for {refid}. Got error {e}')
+        self.save_session()
+        for refid, object in objects.items():
+            if refid in package_data:
+                continue
+            try:
+                package_data[refid] = self._parse_package_data(object, resources[object['resource']['ref']])
+            except KeyError:
+                package_data[refid] = Exception(f'Unable to fetch results for {refid}. Got results {object}')
+        return package_data
 
 
 class AquilaClient(object):
@@ -77,13 +240,22 @@ class AWSClient(object):
         self.client = self.get_client_with_role(resource, role_arn)
 
     def get_client_with_role(self, resource, role_arn):
-        """Gets Boto3 client which authenticates with a specific IAM role."""
-        session = boto3.Session()
-        assumed_role_session = assume_role(session, role_arn)
-        return assumed_role_session.client(resource)
+        """Gets Boto3 client which authenticates with a specific IAM role.
 
-    def deliver_message(self, sns_topic, package, message, outcome, traceback=None, rights_ids=None):
-        """Delivers message to SNS Topic."""
+        Clients are shared across the process, keyed by resource and role. The
+        assumed role credentials are refreshed automatically before they expire.
+        """
+        with _aws_lock:
+            if (resource, role_arn) not in _aws_clients:
+                if role_arn not in _aws_sessions:
+                    _aws_sessions[role_arn] = assume_role(boto3.Session(), role_arn)
+                _aws_clients[(resource, role_arn)] = _aws_sessions[role_arn].client(
+                    resource,
+                    config=Config(max_pool_connections=settings.AWS['max_pool_connections']))
+            return _aws_clients[(resource, role_arn)]
+
+    def _get_message_attributes(self, package, outcome, traceback=None, rights_ids=None):
+        """Returns SNS message attributes for a package."""
         attributes = {
             'service': {
                 'DataType': 'String',
@@ -109,7 +281,33 @@ class AWSClient(object):
                 'DataType': 'String',
                 'StringValue': rights_ids,
             }
+        return attributes
+
+    def deliver_message(self, sns_topic, package, message, outcome, traceback=None, rights_ids=None):
+        """Delivers message to SNS Topic."""
         self.client.publish(
             TopicArn=sns_topic,
             Message=message,
-            MessageAttributes=attributes)
+            MessageAttributes=self._get_message_attributes(package, outcome, traceback=traceback, rights_ids=rights_ids))
+
+    def deliver_messages(self, sns_topic, packages, message, outcome, rights_ids=None):
+        """Delivers a message for each package to SNS Topic, ten messages per request.
+
+        Returns:
+            failed (list): tuples of packages whose messages were not delivered and the reason given.
+        """
+        failed = []
+        packages = list(packages)
+        for start in range(0, len(packages), 10):
+            batch = packages[start:start + 10]
+            response = self.client.publish_batch(
+                TopicArn=sns_topic,
+                PublishBatchRequestEntries=[
+                    {
+                        'Id': str(idx),
+                        'Message': message,
+                        'MessageAttributes': self._get_message_attributes(package, outcome, rights_ids=rights_ids),
+                    } for idx, package in enumerate(batch)])
+            for failure in response.get('Failed', []):
+                failed.append((batch[int(failure['Id'])], failure.get('Message', failure['Code'])))
+        return failed
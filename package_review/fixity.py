@@ -0,0 +1,59 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from os import stat
+
+from django.conf import settings
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def get_checksum(path, algorithm='sha256', chunk_size=CHUNK_SIZE):
+    """Returns the hex digest of a file, read in chunks into a single reusable buffer."""
+    checksum = hashlib.new(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while size := f.readinto(buffer):
+            checksum.update(view[:size])
+    return checksum.hexdigest()
+
+
+def get_checksums(paths, workers=1):
+    """Returns checksums for files, hashing them in parallel.
+
+    Args:
+        paths (list): paths of files to hash.
+        workers (int): number of threads used to read files.
+
+    Returns:
+        checksums (dict): checksums keyed by path. Files which cannot be read
+            are omitted.
+    """
+    def hash_file(path):
+        try:
+            return get_checksum(path, settings.FIXITY['algorithm'])
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return {path: checksum for path, checksum in zip(paths, executor.map(hash_file, paths)) if checksum}
+
+
+def get_stat_key(path):
+    """Returns the inode, size and modification time of a file, which change when it is rewritten or replaced.
+
+    Raises:
+        OSError: if the file cannot be found.
+    """
+    file_stat = stat(path)
+    return f'{file_stat.st_ino}-{file_stat.st_size}-{file_stat.st_mtime_ns}'
+
+
+def has_changed(package_file):
+    """Returns True if a file's size or modification time differ from those recorded when it was discovered.
+
+    Raises:
+        OSError: if the file cannot be found.
+    """
+    file_stat = stat(package_file.absolute_path)
+    return file_stat.st_size != package_file.size or int(file_stat.st_mtime) != int(package_file.mtime.timestamp())
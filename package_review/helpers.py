@@ -1,17 +1,125 @@
+import time
+
 from django.conf import settings
 
 from .clients import AWSClient
+from .models import Package
+
+_config_cache = {}
+
+PACKAGE_DATA_FIELDS = ['title', 'uri', 'resource_title', 'resource_uri', 'undated_object', 'already_digitized']
+
+
+def get_config(path, use_cache=True):
+    """Fetches configuration parameters stored under a path in SSM Parameter Store.
+
+    Parameters are cached in process memory for the number of seconds set in
+    `settings.AWS['config_cache_timeout']`. They include decrypted secrets, so
+    they are never written to Django's cache, which is stored in the database.
 
+    Args:
+        path (string): SSM path under which parameters are stored.
+        use_cache (bool): whether to use cached parameters.
 
-def get_config(path):
+    Returns:
+        configuration (dict): parameter values keyed by parameter name.
+    """
+    timeout = settings.AWS['config_cache_timeout']
+    if use_cache:
+        expires, configuration = _config_cache.get(path, (0, None))
+        if expires > time.monotonic():
+            return dict(configuration)
     ssm_client = AWSClient('ssm', settings.AWS['role_arn']).client
     configuration = {}
-    param_details = ssm_client.get_parameters_by_path(
-        Path=path,
-        Recursive=False,
-        WithDecryption=True)
-    for param in param_details.get('Parameters', []):
-        param_path_array = param.get('Name').split("/")
-        section_name = param_path_array[-1]
-        configuration[section_name] = param.get('Value')
-    return configuration
+    paginator = ssm_client.get_paginator('get_parameters_by_path')
+    for page in paginator.paginate(Path=path, Recursive=False, WithDecryption=True):
+        for param in page.get('Parameters', []):
+            param_path_array = param.get('Name').split("/")
+            section_name = param_path_array[-1]
+            configuration[section_name] = param.get('Value')
+    _config_cache[path] = (time.monotonic() + timeout, configuration)
+    return dict(configuration)
+
+
+def get_package_paths():
+    """Returns package directories in the storage directory, keyed by RefID.
+
+    Hidden directories, such as the default quarantine directory, are not packages.
+    """
+    return {
+        package_path.stem: package_path for package_path in settings.BASE_STORAGE_DIR.iterdir()
+        if not package_path.name.startswith('.')}
+
+
+def invalidate_config(path):
+    """Removes cached configuration parameters for a path."""
+    _config_cache.pop(path, None)
+
+
+def refresh_package_data(client, packages, workers=1, batch_size=25):
+    """Fetches current ArchivesSpace data for packages and saves those which have changed.
+
+    Args:
+        client (ArchivesSpaceClient): client used to fetch data about packages.
+        packages (iterable): Packages to refresh.
+        workers (int): number of threads used to fetch data.
+        batch_size (int): maximum number of RefIDs to look up in a single request.
+
+    Returns:
+        updated (list): Packages whose data changed.
+        errors (dict): exceptions raised while fetching data, keyed by RefID.
+    """
+    packages = list(packages)
+    refids = list(dict.fromkeys(package.refid for package in packages))
+    package_data = client.get_package_data_bulk(refids, batch_size=batch_size, use_cache=False, workers=workers)
+
+    updated = []
+    changed_fields = set()
+    errors = {}
+    for package in packages:
+        data = package_data[package.refid]
+        if isinstance(data, Exception):
+            errors[package.refid] = data
+            continue
+        changed = [field for field, value in zip(PACKAGE_DATA_FIELDS, data) if getattr(package, field) != value]
+        for field, value in zip(PACKAGE_DATA_FIELDS, data):
+            setattr(package, field, value)
+        if changed:
+            changed_fields.update(changed)
+            updated.append(package)
+    if updated:
+        Package.objects.bulk_update(updated, [field for field in PACKAGE_DATA_FIELDS if field in changed_fields])
+    return updated, errors
+
+
+def parse_range_header(header, size):
+    """Parses a single byte range from an HTTP Range header.
+
+    Args:
+        header (string): value of the Range header, e.g. `bytes=0-1023`.
+        size (int): size of the requested file in bytes.
+
+    Returns:
+        byte_range (tuple): start and end (inclusive) of the requested range,
+            or None if the header is missing, malformed or requests multiple
+            ranges, in which case the whole file should be returned.
+
+    Raises:
+        ValueError: if the range cannot be satisfied.
+    """
+    unit, _, ranges = (header or '').partition('=')
+    if unit.strip() != 'bytes' or ',' in ranges:
+        return None
+    start, sep, end = ranges.strip().partition('-')
+    if not sep or not (start.isdigit() or end.isdigit()) or (start and not start.isdigit()) or (end and not end.isdigit()):
+        return None
+    if not start:
+        if int(end) == 0 or size == 0:
+            raise ValueError('Range not satisfiable')
+        return max(size - int(end), 0), size - 1
+    if int(start) >= size:
+        raise ValueError('Range not satisfiable')
+    end = min(int(end), size - 1) if end else size - 1
+    if end < int(start):
+        return None
+    return int(start), end
@@ -0,0 +1,214 @@
+import json
+from fcntl import LOCK_EX, flock
+from hashlib import sha1
+from io import BytesIO
+from math import ceil, log2
+from os import replace, utime
+from pathlib import Path
+from shutil import rmtree
+from tempfile import NamedTemporaryFile, mkdtemp
+
+from django.conf import settings
+from PIL import Image, ImageCms
+
+IMAGE_EXTENSIONS = ['.tif', '.tiff']
+
+
+def is_image(path):
+    """Returns True if a path refers to an image format handled by this module."""
+    return Path(path).suffix.lower() in IMAGE_EXTENSIONS
+
+
+def to_8bit(image):
+    """Converts an image to an 8-bit greyscale or RGB image which can be saved as a JPEG."""
+    if image.mode in ['I;16', 'I;16B', 'I;16L', 'I']:
+        return image.convert('I').point(lambda i: i * (1 / 256)).convert('L')
+    if image.mode not in ['RGB', 'L']:
+        return image.convert('RGB')
+    return image
+
+
+def get_technical_metadata(source):
+    """Returns technical metadata read from an image's headers, without decoding pixel data.
+
+    Returns:
+        metadata (dict): width and height in pixels, bits per sample, samples
+            per pixel, horizontal and vertical resolution in DPI, compression
+            scheme and ICC profile description (None if there is no profile).
+    """
+    with Image.open(source) as image:
+        tags = getattr(image, 'tag_v2', {})
+        bits_per_sample = tags.get(258) or (16 if image.mode.startswith('I;16') else 8,)
+        dpi = image.info.get('dpi')
+        icc_profile = image.info.get('icc_profile')
+        if icc_profile:
+            try:
+                icc_profile = ImageCms.getProfileDescription(ImageCms.ImageCmsProfile(BytesIO(icc_profile))).strip()
+            except (ImageCms.PyCMSError, OSError):
+                icc_profile = 'Unknown'
+        return {
+            'width': image.width,
+            'height': image.height,
+            'bit_depth': max(bits_per_sample) if isinstance(bits_per_sample, tuple) else bits_per_sample,
+            'samples_per_pixel': len(image.getbands()),
+            'dpi': [round(float(value), 2) for value in dpi] if dpi else None,
+            'compression': image.info.get('compression', 'raw'),
+            'icc_profile': icc_profile or None,
+        }
+
+
+def get_fingerprint(source):
+    """Returns a hash of the path, modification time and size of a file, which changes when the file changes."""
+    stat = Path(source).stat()
+    return sha1(f'{Path(source).resolve()}:{stat.st_mtime_ns}:{stat.st_size}'.encode()).hexdigest()
+
+
+def get_cache_path(source, cache_dir, suffix):
+    """Returns the path of a cached derivative of a source file.
+
+    The cache key is the fingerprint of the source, so derivatives are
+    regenerated when the source changes.
+    """
+    key = get_fingerprint(source)
+    return Path(cache_dir, key[:2], f'{key}{suffix}')
+
+
+def get_thumbnail(source, cache_dir=None, size=None):
+    """Returns the path to a downscaled JPEG preview of an image, creating it if necessary.
+
+    Args:
+        source (pathlib.Path): path to the source image.
+        cache_dir (pathlib.Path): directory in which thumbnails are stored.
+        size (int): maximum width and height of the thumbnail in pixels.
+
+    Returns:
+        thumbnail_path (pathlib.Path): path to the cached thumbnail.
+    """
+    cache_dir = cache_dir or settings.THUMBNAILS['cache_dir']
+    size = size or settings.THUMBNAILS['size']
+    thumbnail_path = get_cache_path(source, cache_dir, f'-{size}.jpg')
+    if thumbnail_path.exists():
+        utime(thumbnail_path)
+        return thumbnail_path
+    thumbnail_path.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(prefix=f'{thumbnail_path.name}.', suffix='.tmp', dir=thumbnail_path.parent, delete=False) as tmp_file:
+        tmp_path = Path(tmp_file.name)
+    try:
+        with Image.open(source) as image:
+            image = to_8bit(image)
+            image.thumbnail((size, size), reducing_gap=2.0)
+            image.save(tmp_path, 'JPEG', quality=80)
+        replace(tmp_path, thumbnail_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return thumbnail_path
+
+
+def get_max_level(width, height):
+    """Returns the pyramid level at which an image is shown at full resolution.
+
+    Each level halves the dimensions of the level above it, down to a single
+    pixel at level 0, following the Deep Zoom convention.
+    """
+    return ceil(log2(max(width, height, 1)))
+
+
+def get_pyramid(source, cache_dir=None, tile_size=None, build=True):
+    """Returns the path to a cached tile pyramid for an image, building it if necessary.
+
+    The pyramid directory contains an `info.json` file describing the image,
+    and a directory per level containing `<column>_<row>.jpg` tiles. The full
+    image is decoded once while the pyramid is built; afterwards tiles are
+    served without touching the source. Builds are serialized with a lock file
+    next to the pyramid, so concurrent requests for the same image wait for a
+    single build rather than each building the pyramid.
+
+    Args:
+        source (pathlib.Path): path to the source image.
+        cache_dir (pathlib.Path): directory in which pyramids are stored.
+        tile_size (int): width and height of tiles in pixels.
+        build (bool): whether to build the pyramid if it is not cached.
+
+    Returns:
+        pyramid_path (pathlib.Path): path to the cached pyramid directory, or
+            None if it is not cached and build is False.
+    """
+    cache_dir = cache_dir or settings.TILES['cache_dir']
+    tile_size = tile_size or settings.TILES['tile_size']
+    pyramid_path = get_cache_path(source, cache_dir, f'-{tile_size}')
+    if pyramid_path.exists():
+        utime(pyramid_path)
+        return pyramid_path
+    if not build:
+        return None
+    pyramid_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(pyramid_path.with_name(f'{pyramid_path.name}.lock'), 'w') as lock:
+        flock(lock, LOCK_EX)
+        if pyramid_path.exists():
+            return pyramid_path
+        tmp_path = Path(mkdtemp(prefix=f'{pyramid_path.name}.', suffix='.tmp', dir=pyramid_path.parent))
+        try:
+            with Image.open(source) as image:
+                image = to_8bit(image)
+                width, height = image.size
+                max_level = get_max_level(width, height)
+                for level in range(max_level, -1, -1):
+                    level_path = Path(tmp_path, str(level))
+                    level_path.mkdir()
+                    for column in range(ceil(image.width / tile_size)):
+                        for row in range(ceil(image.height / tile_size)):
+                            box = (column * tile_size, row * tile_size, min((column + 1) * tile_size, image.width), min((row + 1) * tile_size, image.height))
+                            image.crop(box).save(Path(level_path, f'{column}_{row}.jpg'), 'JPEG', quality=85)
+                    if level:
+                        image = image.resize((max(ceil(image.width / 2), 1), max(ceil(image.height / 2), 1)), Image.Resampling.BOX)
+            Path(tmp_path, 'info.json').write_text(json.dumps({'width': width, 'height': height, 'tile_size': tile_size, 'max_level': max_level}))
+            replace(tmp_path, pyramid_path)
+        finally:
+            rmtree(tmp_path, ignore_errors=True)
+    return pyramid_path
+
+
+def get_tile(source, level, column, row, cache_dir=None, tile_size=None):
+    """Returns the path to a tile of an image, or None if the tile or the image's pyramid do not exist.
+
+    Pyramids are not built here; they are built by the `generate_thumbnails` command.
+    """
+    pyramid_path = get_pyramid(source, cache_dir, tile_size, build=False)
+    if not pyramid_path:
+        return None
+    tile_path = Path(pyramid_path, str(level), f'{column}_{row}.jpg')
+    return tile_path if tile_path.is_file() else None
+
+
+def _get_entry_size(path):
+    if path.is_dir():
+        return sum(child.stat().st_size for child in path.rglob('*') if child.is_file())
+    return path.stat().st_size
+
+
+def evict_cache(cache_dir, max_size):
+    """Deletes least recently used entries from a cache directory until it is smaller than max_size bytes.
+
+    Entries are the files or directories (such as tile pyramids) stored below
+    each key prefix, and are evicted whole.
+
+    Returns:
+        evicted (int): number of entries deleted.
+    """
+    entries = []
+    for path in Path(cache_dir).glob('*/*'):
+        if not path.name.endswith(('.tmp', '.lock')):
+            entries.append((path.stat().st_mtime, _get_entry_size(path), path))
+    total_size = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        if path.is_dir():
+            rmtree(path, ignore_errors=True)
+            path.with_name(f'{path.name}.lock').unlink(missing_ok=True)
+        else:
+            path.unlink(missing_ok=True)
+        total_size -= size
+        evicted += 1
+    return evicted
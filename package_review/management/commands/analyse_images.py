@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from package_review.analysis import analyse_images
+from package_review.images import is_image
+from package_review.models import Package, PackageFile
+
+
+class Command(BaseCommand):
+    help = "Detects blank, near-black, skewed and clipped pages in master edited images of packages waiting to be QCed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of processes used to analyse images.')
+
+    def handle(self, *args, **options):
+        files = (
+            PackageFile.objects
+            .filter(package__process_status=Package.PENDING, role=PackageFile.MASTER_EDITED)
+            .select_related('package'))
+        images = [file for file in files if is_image(file.path) and file.absolute_path.is_file()]
+        analysed = analyse_images(images, workers=options.get('workers') or 4)
+        self.stdout.write(self.style.SUCCESS(f'Images analysed: {analysed} ({len(images) - analysed} already analysed).'))
@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from package_review.fixity import get_checksums, get_stat_key, has_changed
+from package_review.models import Package, PackageFile
+from package_review.qc import get_qc_status
+
+
+class Command(BaseCommand):
+    help = "Records checksums of files in packages waiting to be QCed and flags files which have changed since they were discovered."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of threads used to hash files.')
+
+    def get_fixity_issue(self, package_file, checksum):
+        """Returns a QC issue if a file is missing, or has changed since it was discovered.
+
+        Files with a recorded checksum are compared against it. Files being
+        hashed for the first time are compared against the size and
+        modification time recorded when they were discovered.
+        """
+        if not checksum:
+            return {'check': 'fixity', 'level': 'fail', 'message': 'File is missing or unreadable'}
+        if package_file.checksum:
+            changed = package_file.checksum != checksum
+        else:
+            try:
+                changed = has_changed(package_file)
+            except OSError:
+                return {'check': 'fixity', 'level': 'fail', 'message': 'File is missing or unreadable'}
+        if changed:
+            return {'check': 'fixity', 'level': 'fail', 'message': 'File has changed since it was discovered'}
+        return None
+
+    def handle(self, *args, **options):
+        """Hashes files which have no recorded checksum, or whose inode, size or modification time have changed since they were last hashed.
+
+        Fixity issues of files which are not hashed are left as they are, so a
+        changed file stays flagged without being hashed again on every run.
+        """
+        files = list(
+            PackageFile.objects
+            .filter(package__process_status=Package.PENDING)
+            .select_related('package'))
+        to_hash = []
+        stat_keys = {}
+        for file in files:
+            try:
+                stat_keys[file.pk] = get_stat_key(file.absolute_path)
+            except OSError:
+                to_hash.append(file)
+                continue
+            if not file.checksum or stat_keys[file.pk] != file.checksum_stat:
+                to_hash.append(file)
+        checksums = get_checksums([file.absolute_path for file in to_hash], workers=options.get('workers') or 4)
+        hashed_ids = {file.pk for file in to_hash}
+
+        updated_files = []
+        changed_packages = {}
+        recorded = 0
+        for file in files:
+            fixity_issues = [issue for issue in file.qc_issues if issue['check'] == 'fixity']
+            changed = False
+            if file.pk in hashed_ids:
+                checksum = checksums.get(file.absolute_path)
+                issue = self.get_fixity_issue(file, checksum)
+                fixity_issues = [issue] if issue else []
+                if checksum and file.pk in stat_keys:
+                    if not file.checksum:
+                        file.checksum = checksum
+                        recorded += 1
+                    file.checksum_stat = stat_keys[file.pk]
+                    changed = True
+            qc_issues = [existing for existing in file.qc_issues if existing['check'] != 'fixity'] + fixity_issues
+            if qc_issues != file.qc_issues:
+                file.qc_issues = qc_issues
+                changed_packages[file.package.pk] = file.package
+                changed = True
+            if changed:
+                updated_files.append(file)
+
+        for package in changed_packages.values():
+            issues = [issue for file in files if file.package.pk == package.pk for issue in file.qc_issues]
+            if issues or package.qc_status != Package.QC_UNCHECKED:
+                package.qc_status = get_qc_status(issues)
+        with transaction.atomic():
+            PackageFile.objects.bulk_update(updated_files, ['checksum', 'checksum_stat', 'qc_issues'])
+            Package.objects.bulk_update(changed_packages.values(), ['qc_status'])
+
+        flagged = [file for file in files if any(issue['check'] == 'fixity' for issue in file.qc_issues)]
+        for file in flagged:
+            self.stdout.write(self.style.ERROR(f'{file.package.refid}/{file.path}: {file.qc_issues[-1]["message"]}'))
+        self.stdout.write(self.style.SUCCESS(f'Checked {len(files)} files ({recorded} checksums recorded, {len(flagged)} files flagged).'))
@@ -2,6 +2,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from package_review.clients import AWSClient
+from package_review.helpers import get_package_paths
 
 
 class Command(BaseCommand):
@@ -13,7 +14,7 @@ class Command(BaseCommand):
             exit()
         sns_client = AWSClient('sns', settings.AWS['role_arn'])
 
-        if not any(settings.BASE_STORAGE_DIR.iterdir()):
+        if not get_package_paths():
             sns_client.deliver_message(
                 settings.AWS['sns_topic'],
                 None,
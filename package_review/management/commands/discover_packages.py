@@ -1,55 +1,230 @@
 import logging
+import math
+import time
 import traceback
-from os import getenv
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from os import getenv, scandir, walk
+from pathlib import Path
 
-from directory_tree import display_tree
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import close_old_connections, transaction
 
 from package_review.clients import ArchivesSpaceClient, AWSClient
-from package_review.helpers import get_config
-from package_review.models import Package
+from package_review.helpers import get_config, get_package_paths
+from package_review.models import DiscoveredPackage, Package, PackageFile
+from package_review.qc import run_qc_checks
 
 logging.basicConfig(
     level=int(getenv('LOGGING_LEVEL', logging.INFO)),
     format='%(filename)s::%(funcName)s::%(lineno)s %(message)s')
 
 
+BATCH_SIZE = 25
+
+
 class Command(BaseCommand):
     help = "Discovers new packages to be QCed."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of threads used to fetch ArchivesSpace data, build package trees, and processes used to check images.')
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running, discovering new package directories as soon as they stop changing.')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds between checks of the storage directory in watch mode.')
+        parser.add_argument(
+            '--settle-time',
+            type=float,
+            default=30,
+            help='Seconds a new package directory must remain unchanged before it is discovered in watch mode.')
+
     def _get_dir_tree(self, root_path):
-        return display_tree(root_path, string_rep=True, show_hidden=True)
+        """Returns a nested representation of a directory and its contents.
 
-    def handle(self, *args, **options):
-        if not settings.BASE_STORAGE_DIR.is_dir():
-            self.stdout.write(self.style.ERROR(f'Root directory {str(settings.BASE_STORAGE_DIR)} for files waiting to be QCed does not exist.'))
-            exit()
-        created_list = []
-        configuration = get_config(f"/{getenv('ENV')}/{getenv('APP_CONFIG_PATH')}")
+        Directories are represented by their name, modification time, total size,
+        file count and a list of children. Files are represented by their name,
+        size and modification time.
+        """
+        children = []
+        with scandir(root_path) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                if entry.is_dir(follow_symlinks=False):
+                    children.append(self._get_dir_tree(entry.path))
+                else:
+                    stat = entry.stat(follow_symlinks=False)
+                    children.append({'name': entry.name, 'size': stat.st_size, 'mtime': int(stat.st_mtime)})
+        return {
+            'name': Path(root_path).name,
+            'mtime': int(Path(root_path).stat().st_mtime),
+            'size': sum(child['size'] for child in children),
+            'file_count': sum(child.get('file_count', 1) for child in children),
+            'children': children,
+        }
 
-        client = ArchivesSpaceClient(
-            baseurl=configuration.get('AS_BASEURL'),
-            username=configuration.get('AS_USERNAME'),
-            password=configuration.get('AS_PASSWORD'),
-            repository=configuration.get('AS_REPO'))
-        for package_path in settings.BASE_STORAGE_DIR.iterdir():
-            refid = package_path.stem
-            if not Package.objects.filter(refid=refid, process_status=Package.PENDING).exists():
+    def _get_package_files(self, package, tree, parent=''):
+        """Yields unsaved PackageFiles for each file in a package tree.
+
+        Args:
+            package (Package): package to which the files belong.
+            tree (dict): package tree, as returned by `_get_dir_tree`.
+            parent (string): path of the tree relative to the package root.
+        """
+        for child in tree['children']:
+            path = f'{parent}{child["name"]}'
+            if 'children' in child:
+                yield from self._get_package_files(package, child, f'{path}/')
+            else:
+                role = path.split('/')[0] if '/' in path else ''
+                yield PackageFile(
+                    package=package,
+                    path=path,
+                    role=role if role in dict(PackageFile.ROLE_CHOICES) else '',
+                    size=child['size'],
+                    mtime=datetime.fromtimestamp(child['mtime'], tz=timezone.utc))
+
+    def _get_fingerprint(self, package_path):
+        """Returns a cheap fingerprint of the contents of a package directory.
+
+        The fingerprint combines the number of files, their total size and the
+        most recent modification time, so it changes whenever files are added,
+        removed or rewritten.
+        """
+        file_count = total_size = latest_mtime = 0
+        for dirpath, _, filenames in walk(package_path):
+            for filename in filenames:
+                stat = Path(dirpath, filename).stat()
+                file_count += 1
+                total_size += stat.st_size
+                latest_mtime = max(latest_mtime, stat.st_mtime_ns)
+        return f'{file_count}-{total_size}-{latest_mtime}'
+
+    def _get_package_fields(self, refid, package_path, data):
+        """Returns field values for a new Package.
+
+        Args:
+            refid (string): RefID of the package.
+            package_path (pathlib.Path): path to the package directory.
+            data (tuple or Exception): result of an ArchivesSpace lookup for the RefID.
+
+        Returns:
+            fields (dict): keyword arguments for creating a Package.
+        """
+        if isinstance(data, Exception):
+            raise data
+        title, uri, resource_title, resource_uri, undated_object, already_digitized = data
+        return {
+            'title': title,
+            'uri': uri,
+            'resource_title': resource_title,
+            'resource_uri': resource_uri,
+            'undated_object': undated_object,
+            'already_digitized': already_digitized,
+            'refid': refid,
+            'tree': self._get_dir_tree(package_path),
+            'process_status': Package.PENDING,
+        }
+
+    def _get_settled_paths(self, seen, settling, now, settle_time):
+        """Returns new package directories which have stopped changing.
+
+        Args:
+            seen (set): names of directories which have already been handled.
+            settling (dict): fingerprints and last change times of new directories, keyed by RefID.
+            now (float): current monotonic time.
+            settle_time (float): seconds a directory must remain unchanged.
+
+        Returns:
+            package_paths (dict): paths to settled package directories, keyed by RefID.
+        """
+        current = get_package_paths()
+        seen.intersection_update(current)
+        for refid in list(settling):
+            if refid not in current:
+                del settling[refid]
+        package_paths = {}
+        for refid, package_path in current.items():
+            if refid in seen:
+                continue
+            fingerprint = self._get_fingerprint(package_path)
+            if refid not in settling or settling[refid][0] != fingerprint:
+                settling[refid] = (fingerprint, now)
+            elif now - settling[refid][1] >= settle_time:
+                package_paths[refid] = package_path
+                del settling[refid]
+        return package_paths
+
+    def _get_handled_refids(self, package_paths):
+        """Returns RefIDs of package directories which need no further discovery.
+
+        A directory is handled if it has a pending Package, or if its contents
+        are unchanged since it was last discovered. Directories whose discovery
+        failed are not handled, so they are retried.
+
+        Args:
+            package_paths (dict): paths to package directories, keyed by RefID.
+
+        Returns:
+            refids (set): RefIDs of handled directories.
+        """
+        handled = set(
+            Package.objects
+            .filter(refid__in=list(package_paths), process_status=Package.PENDING)
+            .values_list('refid', flat=True))
+        discovered = dict(
+            DiscoveredPackage.objects
+            .filter(refid__in=[refid for refid in package_paths if refid not in handled])
+            .values_list('refid', 'fingerprint'))
+        handled.update(
+            refid for refid, fingerprint in discovered.items()
+            if self._get_fingerprint(package_paths[refid]) == fingerprint)
+        return handled
+
+    def discover(self, client, package_paths, workers=1):
+        """Creates Packages for new or changed package directories.
+
+        Technical metadata of images in new packages is checked against
+        `settings.QC_CHECKS` before the packages are saved. Checksums are
+        recorded later by the `check_fixity` command, so discovery does not
+        read every byte of new packages.
+
+        Args:
+            client (ArchivesSpaceClient): client used to fetch data about packages.
+            package_paths (dict): paths to package directories, keyed by RefID.
+            workers (int): number of threads used to fetch data and build trees, and processes used to check images.
+
+        Returns:
+            created_list (list): RefIDs of created packages.
+        """
+        pending_refids = set(Package.objects.filter(process_status=Package.PENDING).values_list('refid', flat=True))
+        discovered = dict(DiscoveredPackage.objects.values_list('refid', 'fingerprint'))
+        candidate_paths = {
+            refid: package_path for refid, package_path in package_paths.items()
+            if refid not in pending_refids}
+
+        new_packages = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            fingerprints = dict(zip(candidate_paths, executor.map(self._get_fingerprint, candidate_paths.values())))
+            package_paths = {
+                refid: package_path for refid, package_path in candidate_paths.items()
+                if discovered.get(refid) != fingerprints[refid]}
+            package_data = client.get_package_data_bulk(list(package_paths), batch_size=BATCH_SIZE, workers=workers) if package_paths else {}
+            futures = {
+                refid: executor.submit(self._get_package_fields, refid, package_path, package_data[refid])
+                for refid, package_path in package_paths.items()}
+
+            for refid, future in futures.items():
                 try:
-                    title, uri, resource_title, resource_uri, undated_object, already_digitized = client.get_package_data(refid)
-                    package_tree = self._get_dir_tree(package_path)
-                    Package.objects.create(
-                        title=title,
-                        uri=uri,
-                        resource_title=resource_title,
-                        resource_uri=resource_uri,
-                        undated_object=undated_object,
-                        already_digitized=already_digitized,
-                        refid=refid,
-                        tree=package_tree,
-                        process_status=Package.PENDING)
-                    created_list.append(refid)
+                    new_packages.append(Package(**future.result()))
                 except Exception as e:
                     logging.exception(e)
                     exception = "\n".join(traceback.format_exception(e))
@@ -62,5 +237,69 @@ class Command(BaseCommand):
                         traceback=exception)
                     continue
 
+        package_files = {package.refid: list(self._get_package_files(package, package.tree)) for package in new_packages}
+        all_files = [package_file for files in package_files.values() for package_file in files]
+        run_qc_checks(all_files, workers)
+
+        if new_packages:
+            with transaction.atomic():
+                Package.objects.bulk_create(new_packages, ignore_conflicts=True)
+                created = dict(
+                    Package.objects
+                    .filter(refid__in=[package.refid for package in new_packages], process_status=Package.PENDING, files__isnull=True)
+                    .values_list('refid', 'pk'))
+                new_packages = [package for package in new_packages if package.refid in created]
+                for package in new_packages:
+                    package.pk = created[package.refid]
+                PackageFile.objects.bulk_create(
+                    [package_file for package in new_packages for package_file in package_files[package.refid]])
+                DiscoveredPackage.objects.bulk_create(
+                    [DiscoveredPackage(refid=package.refid, fingerprint=fingerprints[package.refid]) for package in new_packages],
+                    update_conflicts=True,
+                    unique_fields=['refid'],
+                    update_fields=['fingerprint', 'last_modified'])
+        return [package.refid for package in new_packages]
+
+    def watch(self, client, interval, settle_time, workers=1):
+        """Polls the storage directory and discovers new package directories once they settle.
+
+        Only the names of directories in the storage directory are listed on each
+        poll; the contents of a directory are only examined until it has been
+        handled. Directories whose discovery fails are kept in `settling` with a
+        change time which never settles, so they are only retried once their
+        contents change and settle again.
+        """
+        seen = self._get_handled_refids(get_package_paths())
+        settling = {}
+        while True:
+            close_old_connections()
+            package_paths = self._get_settled_paths(seen, settling, time.monotonic(), settle_time)
+            if package_paths:
+                created_list = self.discover(client, package_paths, workers)
+                if created_list:
+                    self.stdout.write(self.style.SUCCESS(f'Packages created: {", ".join(created_list)}'))
+                handled = self._get_handled_refids(package_paths)
+                seen.update(handled)
+                for refid, package_path in package_paths.items():
+                    if refid not in handled:
+                        settling[refid] = (self._get_fingerprint(package_path), math.inf)
+            time.sleep(interval)
+
+    def handle(self, *args, **options):
+        if not settings.BASE_STORAGE_DIR.is_dir():
+            self.stdout.write(self.style.ERROR(f'Root directory {str(settings.BASE_STORAGE_DIR)} for files waiting to be QCed does not exist.'))
+            exit()
+        configuration = get_config(f"/{getenv('ENV')}/{getenv('APP_CONFIG_PATH')}")
+
+        client = ArchivesSpaceClient(
+            baseurl=configuration.get('AS_BASEURL'),
+            username=configuration.get('AS_USERNAME'),
+            password=configuration.get('AS_PASSWORD'),
+            repository=configuration.get('AS_REPO'))
+        workers = options.get('workers') or 1
+        created_list = self.discover(client, get_package_paths(), workers)
         message = f'Packages created: {", ".join(created_list)}' if len(created_list) else 'No new packages to discover.'
         self.stdout.write(self.style.SUCCESS(message))
+
+        if options.get('watch'):
+            self.watch(client, options['interval'], options['settle_time'], workers)
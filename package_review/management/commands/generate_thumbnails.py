@@ -0,0 +1,50 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from package_review.images import (evict_cache, get_pyramid, get_thumbnail,
+                                   is_image)
+from package_review.models import Package, PackageFile
+
+
+class Command(BaseCommand):
+    help = "Generates thumbnails and tile pyramids for images in packages waiting to be QCed and evicts old thumbnails and tiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of processes used to generate thumbnails and tile pyramids.')
+
+    def handle(self, *args, **options):
+        files = (
+            PackageFile.objects
+            .filter(package__process_status=Package.PENDING, role__in=[PackageFile.MASTER_EDITED, PackageFile.MASTER])
+            .select_related('package'))
+        sources = [file.absolute_path for file in files if is_image(file.path)]
+        cache_dir = settings.THUMBNAILS['cache_dir']
+        size = settings.THUMBNAILS['size']
+        generated = errors = 0
+        tiled = tile_errors = 0
+        with ProcessPoolExecutor(max_workers=options.get('workers') or 4) as executor:
+            futures = {executor.submit(get_thumbnail, source, cache_dir, size): source for source in sources if source.is_file()}
+            pyramid_futures = {executor.submit(get_pyramid, source): source for source in sources if source.is_file()}
+            for future, source in futures.items():
+                try:
+                    future.result()
+                    generated += 1
+                except Exception as e:
+                    errors += 1
+                    self.stdout.write(self.style.ERROR(f'Unable to generate thumbnail for {source}: {e}'))
+            for future, source in pyramid_futures.items():
+                try:
+                    future.result()
+                    tiled += 1
+                except Exception as e:
+                    tile_errors += 1
+                    self.stdout.write(self.style.ERROR(f'Unable to generate tiles for {source}: {e}'))
+        evicted = evict_cache(cache_dir, settings.THUMBNAILS['max_cache_size'])
+        evicted += evict_cache(settings.TILES['cache_dir'], settings.TILES['max_cache_size'])
+        self.stdout.write(self.style.SUCCESS(f'Thumbnails available for {generated} images and tiles for {tiled} images ({errors + tile_errors} errors, {evicted} evicted from cache).'))
@@ -0,0 +1,200 @@
+import logging
+import time
+from datetime import timedelta
+from os import getenv, utime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from package_review.clients import AWSClient
+from package_review.models import Job, Package
+
+logging.basicConfig(
+    level=int(getenv('LOGGING_LEVEL', logging.INFO)),
+    format='%(filename)s::%(funcName)s::%(lineno)s %(message)s')
+
+
+BATCH_SIZE = 50
+
+
+class Command(BaseCommand):
+    help = "Processes queued bulk approvals and rejections."
+    messages = {
+        Job.APPROVE: ('Package reviewed and approved.', 'SUCCESS'),
+        Job.REJECT: ('Package reviewed and rejected.', 'FAILURE'),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running, processing jobs as they are queued.')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Seconds between checks for queued jobs in watch mode.')
+        parser.add_argument(
+            '--stale-after',
+            type=float,
+            default=600,
+            help='Seconds after which a running job which has made no progress is requeued.')
+
+    def _requeue_stale_jobs(self, stale_after):
+        """Requeues running jobs which have not recorded progress recently.
+
+        Running jobs save their progress after every batch, so a job which has
+        not been modified for longer than `stale_after` seconds belonged to a
+        worker which crashed or was restarted. Requeued jobs resume with the
+        packages they still have pending.
+        """
+        cutoff = timezone.now() - timedelta(seconds=stale_after)
+        return Job.objects.filter(status=Job.RUNNING, last_modified__lt=cutoff).update(status=Job.QUEUED)
+
+    def _claim_job(self, stale_after=600):
+        """Marks the oldest queued job as running and returns it."""
+        self._requeue_stale_jobs(stale_after)
+        with transaction.atomic():
+            job = Job.objects.select_for_update(skip_locked=True).filter(status=Job.QUEUED).order_by('pk').first()
+            if job:
+                job.status = Job.RUNNING
+                job.save(update_fields=['status', 'last_modified'])
+        return job
+
+    def quarantine_files(self, package):
+        """Moves files from storage directory to quarantine directory.
+
+        The move is a single rename, so the quarantine directory must be on the
+        same filesystem as the storage directory. Quarantined files are deleted
+        by the `purge_quarantine` command.
+
+        Returns:
+            quarantine_dir (pathlib.Path): path to the quarantined files, or None if there were no files.
+
+        Raises:
+            OSError: if the quarantine directory is on a different filesystem.
+        """
+        bag_dir = Path(settings.BASE_STORAGE_DIR, package.refid)
+        if bag_dir.exists():
+            settings.QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+            if bag_dir.stat().st_dev != settings.QUARANTINE_DIR.stat().st_dev:
+                raise OSError(f'Quarantine directory {settings.QUARANTINE_DIR} is not on the same filesystem as {settings.BASE_STORAGE_DIR}.')
+            quarantine_dir = Path(settings.QUARANTINE_DIR, f'{package.refid}.{int(time.time())}')
+            bag_dir.rename(quarantine_dir)
+            utime(quarantine_dir)
+            return quarantine_dir
+
+    def restore_files(self, package, quarantine_dir):
+        """Moves quarantined files back to the storage directory."""
+        quarantine_dir.rename(Path(settings.BASE_STORAGE_DIR, package.refid))
+
+    def _restore_quarantined(self, packages, quarantined):
+        """Moves the quarantined files of packages back to the storage directory.
+
+        Restored packages are removed from `quarantined`. Every package is
+        attempted even if restoring another fails.
+
+        Returns:
+            errors (list): RefIDs and error messages for packages whose files could not be restored.
+        """
+        errors = []
+        for package in packages:
+            quarantine_dir = quarantined.pop(package.pk, None)
+            if quarantine_dir:
+                try:
+                    self.restore_files(package, quarantine_dir)
+                except Exception as e:
+                    logging.exception(e)
+                    errors.append({'refid': package.refid, 'error': f'Unable to restore quarantined files: {e}'})
+        return errors
+
+    def _process_batch(self, job, aws_client, batch):
+        """Delivers messages and updates statuses for a batch of packages.
+
+        The batch is locked and narrowed to packages which are still pending and
+        claimed by this job before anything else happens, so files are only moved
+        and messages only sent for packages this job holds. Rejected packages are
+        quarantined before their messages are sent, and their files are moved
+        back if delivery fails or raises, so they can be reviewed again.
+
+        Returns:
+            errors (list): RefIDs and error messages for packages which could not be processed.
+        """
+        errors = []
+        with transaction.atomic():
+            batch = list(
+                Package.objects
+                .select_for_update()
+                .filter(pk__in=[package.pk for package in batch], process_status=Package.PENDING, active_job=job))
+            quarantined = {}
+            if job.action == Job.REJECT:
+                for package in list(batch):
+                    try:
+                        quarantined[package.pk] = self.quarantine_files(package)
+                    except Exception as e:
+                        logging.exception(e)
+                        errors.append({'refid': package.refid, 'error': str(e)})
+                        batch.remove(package)
+            message, outcome = self.messages[job.action]
+            try:
+                failed = aws_client.deliver_messages(
+                    settings.AWS['sns_topic'],
+                    batch,
+                    message,
+                    outcome,
+                    rights_ids=job.rights_ids if job.action == Job.APPROVE else None) if batch else []
+                errors += [{'refid': package.refid, 'error': reason} for package, reason in failed]
+                failed_ids = [package.pk for package, _ in failed]
+                errors += self._restore_quarantined([package for package, _ in failed], quarantined)
+                if job.action == Job.APPROVE:
+                    fields = {'process_status': Package.APPROVED, 'rights_ids': job.rights_ids}
+                else:
+                    fields = {'process_status': Package.REJECTED}
+                Package.objects.filter(pk__in=[package.pk for package in batch if package.pk not in failed_ids]).update(**fields)
+            except Exception:
+                self._restore_quarantined(batch, quarantined)
+                raise
+        return errors
+
+    def process(self, job):
+        """Approves or rejects the packages in a job, recording progress and errors.
+
+        Once the job finishes, its packages are released so that any which are
+        still pending can be acted on again.
+        """
+        try:
+            aws_client = AWSClient('sns', settings.AWS['role_arn'])
+            packages = list(job.packages.filter(process_status=Package.PENDING))
+            job.processed_count = job.packages.count() - len(packages)
+            for start in range(0, len(packages), BATCH_SIZE):
+                batch = packages[start:start + BATCH_SIZE]
+                try:
+                    job.errors += self._process_batch(job, aws_client, batch)
+                except Exception as e:
+                    logging.exception(e)
+                    job.errors += [{'refid': package.refid, 'error': str(e)} for package in batch]
+                job.processed_count += len(batch)
+                job.save(update_fields=['processed_count', 'errors', 'last_modified'])
+            job.status = Job.COMPLETE
+        except Exception as e:
+            logging.exception(e)
+            job.errors.append({'refid': None, 'error': str(e)})
+            job.status = Job.FAILED
+        with transaction.atomic():
+            job.save()
+            Package.objects.filter(active_job=job).update(active_job=None)
+
+    def handle(self, *args, **options):
+        stale_after = options.get('stale_after', 600)
+        while True:
+            job = self._claim_job(stale_after)
+            while job:
+                self.process(job)
+                self.stdout.write(self.style.SUCCESS(f'Processed job {job.pk}: {job}'))
+                job = self._claim_job(stale_after)
+            if not options.get('watch'):
+                break
+            time.sleep(options['interval'])
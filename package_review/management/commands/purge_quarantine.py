@@ -0,0 +1,51 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import walk
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Deletes rejected packages which have been quarantined for longer than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days',
+            type=float,
+            default=settings.QUARANTINE_RETENTION_DAYS,
+            help='Number of days quarantined packages are kept before being deleted.')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Number of threads used to delete files.')
+
+    def purge(self, package_dir, executor):
+        """Deletes a quarantined package, unlinking files in parallel."""
+        files = []
+        dirs = []
+        for dirpath, dirnames, filenames in walk(package_dir):
+            dirs.append(Path(dirpath))
+            files += [Path(dirpath, filename) for filename in filenames]
+            files += [Path(dirpath, dirname) for dirname in dirnames if Path(dirpath, dirname).is_symlink()]
+        list(executor.map(Path.unlink, files))
+        for dir in reversed(dirs):
+            dir.rmdir()
+
+    def handle(self, *args, **options):
+        purged_list = []
+        if settings.QUARANTINE_DIR.is_dir():
+            cutoff = time.time() - (options.get('retention_days', settings.QUARANTINE_RETENTION_DAYS) * 86400)
+            with ThreadPoolExecutor(max_workers=options.get('workers') or 8) as executor:
+                for package_dir in settings.QUARANTINE_DIR.iterdir():
+                    try:
+                        if package_dir.stat().st_mtime < cutoff:
+                            self.purge(package_dir, executor)
+                            purged_list.append(package_dir.name)
+                    except OSError as e:
+                        self.stdout.write(self.style.ERROR(f'Unable to purge {package_dir.name}: {e}'))
+
+        message = f'Packages purged: {", ".join(purged_list)}' if len(purged_list) else 'No quarantined packages to purge.'
+        self.stdout.write(self.style.SUCCESS(message))
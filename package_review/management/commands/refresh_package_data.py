@@ -0,0 +1,33 @@
+from os import getenv
+
+from django.core.management.base import BaseCommand
+
+from package_review.clients import ArchivesSpaceClient
+from package_review.helpers import get_config, refresh_package_data
+from package_review.models import Package
+
+
+class Command(BaseCommand):
+    help = "Refreshes ArchivesSpace data for packages waiting to be QCed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of threads used to fetch ArchivesSpace data.')
+
+    def handle(self, *args, **options):
+        configuration = get_config(f"/{getenv('ENV')}/{getenv('APP_CONFIG_PATH')}")
+        client = ArchivesSpaceClient(
+            baseurl=configuration.get('AS_BASEURL'),
+            username=configuration.get('AS_USERNAME'),
+            password=configuration.get('AS_PASSWORD'),
+            repository=configuration.get('AS_REPO'))
+        packages = Package.objects.filter(process_status=Package.PENDING)
+        updated, errors = refresh_package_data(client, packages, workers=options.get('workers') or 4)
+
+        for refid, error in errors.items():
+            self.stdout.write(self.style.ERROR(f'Unable to refresh data for {refid}: {error}'))
+        message = f'Packages updated: {", ".join(package.refid for package in updated)}' if len(updated) else 'No package data changed.'
+        self.stdout.write(self.style.SUCCESS(f'{message} ({len(packages)} packages checked, {len(errors)} errors)'))
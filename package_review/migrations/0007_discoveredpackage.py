@@ -0,0 +1,52 @@
+# Generated by Django 5.1.1 on 2026-10-17 01:50
+
+from os import walk
+from pathlib import Path
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def get_fingerprint(package_path):
+    """Returns the fingerprint recorded by discover_packages for a package directory."""
+    file_count = total_size = latest_mtime = 0
+    for dirpath, _, filenames in walk(package_path):
+        for filename in filenames:
+            stat = Path(dirpath, filename).stat()
+            file_count += 1
+            total_size += stat.st_size
+            latest_mtime = max(latest_mtime, stat.st_mtime_ns)
+    return f'{file_count}-{total_size}-{latest_mtime}'
+
+
+def backfill_discovered_packages(apps, schema_editor):
+    """Records package directories which already have Packages, so they are not discovered again."""
+    Package = apps.get_model('package_review', 'Package')
+    DiscoveredPackage = apps.get_model('package_review', 'DiscoveredPackage')
+    refids = set(Package.objects.values_list('refid', flat=True))
+    if not refids or not Path(settings.BASE_STORAGE_DIR).is_dir():
+        return
+    DiscoveredPackage.objects.bulk_create(
+        [DiscoveredPackage(refid=package_path.stem, fingerprint=get_fingerprint(package_path))
+         for package_path in Path(settings.BASE_STORAGE_DIR).iterdir() if package_path.stem in refids and not package_path.name.startswith('.')],
+        ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package_review', '0006_rename_possible_duplicate_package_already_digitized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscoveredPackage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('refid', models.CharField(max_length=32, unique=True)),
+                ('fingerprint', models.CharField(max_length=100)),
+                ('last_modified', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_discovered_packages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-17 01:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package_review', '0007_discoveredpackage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255)),
+                ('role', models.CharField(blank=True, choices=[('master', 'Master'), ('master_edited', 'Master Edited'), ('service_edited', 'Service Edited')], max_length=20)),
+                ('size', models.BigIntegerField()),
+                ('mtime', models.DateTimeField()),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='package_review.package')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['package', 'role'], name='package_rev_package_f7fa33_idx'), models.Index(fields=['role', 'size'], name='package_rev_role_c5b459_idx')],
+            },
+        ),
+    ]
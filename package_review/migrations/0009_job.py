@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-17 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package_review', '0008_packagefile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('approve', 'Approve'), ('reject', 'Reject')], max_length=10)),
+                ('status', models.IntegerField(choices=[(0, 'Queued'), (1, 'Running'), (9, 'Complete'), (5, 'Failed')], default=0)),
+                ('rights_ids', models.CharField(blank=True, max_length=100, null=True)),
+                ('processed_count', models.IntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('last_modified', models.DateTimeField(auto_now=True)),
+                ('packages', models.ManyToManyField(related_name='jobs', to='package_review.package')),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+SEARCH_COLUMNS = ['title', 'resource_title', 'refid']
+
+
+def create_search_indexes(apps, schema_editor):
+    """Creates trigram indexes supporting case-insensitive substring searches on PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS package_review_package_{column}_trgm '
+            f'ON package_review_package USING gin ((UPPER({column}::text)) gin_trgm_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS package_review_package_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package_review', '0009_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-17 02:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package_review', '0010_package_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['process_status', 'title', 'id'], name='package_rev_process_fa3c3c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['process_status', 'resource_title', 'id'], name='package_rev_process_4499fc_idx'),
+        ),
+    ]
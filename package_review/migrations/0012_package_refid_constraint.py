@@ -0,0 +1,36 @@
+# Generated by Django 5.1.1 on 2026-10-17 02:01
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def delete_duplicate_pending_packages(apps, schema_editor):
+    """Deletes all but the most recently created pending Package for each RefID."""
+    Package = apps.get_model('package_review', 'Package')
+    duplicates = (
+        Package.objects
+        .filter(process_status=0)
+        .values('refid')
+        .annotate(count=Count('pk'), newest=Max('pk'))
+        .filter(count__gt=1))
+    for duplicate in duplicates:
+        Package.objects.filter(refid=duplicate['refid'], process_status=0).exclude(pk=duplicate['newest']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package_review', '0011_package_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['process_status', 'refid'], name='package_rev_process_de28b3_idx'),
+        ),
+        migrations.RunPython(delete_duplicate_pending_packages, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='package',
+            constraint=models.UniqueConstraint(condition=models.Q(('process_status', 0)), fields=('refid',), name='unique_pending_refid'),
+        ),
+    ]
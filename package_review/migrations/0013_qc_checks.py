@@ -0,0 +1,32 @@
+# Generated by Django 5.1.1 on 2026-10-17 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package_review', '0012_package_refid_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='qc_status',
+            field=models.IntegerField(choices=[(0, 'Not checked'), (1, 'Pass'), (2, 'Warn'), (3, 'Fail')], default=0),
+        ),
+        migrations.AddField(
+            model_name='packagefile',
+            name='qc_issues',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='packagefile',
+            name='technical_metadata',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['process_status', 'qc_status', 'id'], name='package_rev_process_6d4fdd_idx'),
+        ),
+    ]
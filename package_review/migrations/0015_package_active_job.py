@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-17 02:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def claim_active_job_packages(apps, schema_editor):
+    """Assigns packages in queued or running jobs to those jobs."""
+    Job = apps.get_model('package_review', 'Job')
+    Package = apps.get_model('package_review', 'Package')
+    for job in Job.objects.filter(status__in=[0, 1]).order_by('pk'):
+        Package.objects.filter(jobs=job, active_job__isnull=True).update(active_job=job)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package_review', '0014_packagefile_checksum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='active_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_packages', to='package_review.job'),
+        ),
+        migrations.RunPython(claim_active_job_packages, migrations.RunPython.noop),
+    ]
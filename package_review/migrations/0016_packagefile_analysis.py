@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-17 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package_review', '0015_package_active_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packagefile',
+            name='analysis',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-17 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package_review', '0016_packagefile_analysis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packagefile',
+            name='checksum_stat',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
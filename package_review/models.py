@@ -1,3 +1,6 @@
+from pathlib import Path
+
+from django.conf import settings
 from django.db import models
 
 
@@ -10,6 +13,15 @@ class Package(models.Model):
         (PENDING, 'Pending'),
         (APPROVED, 'Approved'),
         (REJECTED, 'Rejected'))
+    QC_UNCHECKED = 0
+    QC_PASS = 1
+    QC_WARN = 2
+    QC_FAIL = 3
+    QC_STATUS_CHOICES = (
+        (QC_UNCHECKED, 'Not checked'),
+        (QC_PASS, 'Pass'),
+        (QC_WARN, 'Warn'),
+        (QC_FAIL, 'Fail'))
 
     title = models.CharField(max_length=255)
     uri = models.CharField(max_length=255)
@@ -21,6 +33,22 @@ class Package(models.Model):
     tree = models.JSONField(null=True, blank=True)
     process_status = models.IntegerField(choices=PROCESS_STATUS_CHOICES)
     rights_ids = models.CharField(max_length=100, null=True, blank=True)
+    qc_status = models.IntegerField(choices=QC_STATUS_CHOICES, default=QC_UNCHECKED)
+    active_job = models.ForeignKey('Job', null=True, blank=True, on_delete=models.SET_NULL, related_name='claimed_packages')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['process_status', 'refid']),
+            models.Index(fields=['process_status', 'qc_status', 'id']),
+            models.Index(fields=['process_status', 'title', 'id']),
+            models.Index(fields=['process_status', 'resource_title', 'id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['refid'],
+                condition=models.Q(process_status=0),
+                name='unique_pending_refid'),
+        ]
 
     def __str__(self):
         return self.title
@@ -33,6 +61,83 @@ class Package(models.Model):
         return f'https://as.rockarch.org/resources/{resource_id}#tree::archival_object_{object_id}'
 
 
+class PackageFile(models.Model):
+    """File within a package."""
+    MASTER = 'master'
+    MASTER_EDITED = 'master_edited'
+    SERVICE_EDITED = 'service_edited'
+    ROLE_CHOICES = (
+        (MASTER, 'Master'),
+        (MASTER_EDITED, 'Master Edited'),
+        (SERVICE_EDITED, 'Service Edited'))
+
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='files')
+    path = models.CharField(max_length=255)
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES, blank=True)
+    size = models.BigIntegerField()
+    mtime = models.DateTimeField()
+    technical_metadata = models.JSONField(null=True, blank=True)
+    qc_issues = models.JSONField(default=list, blank=True)
+    checksum = models.CharField(max_length=128, blank=True)
+    checksum_stat = models.CharField(max_length=100, blank=True)
+    analysis = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['package', 'role']),
+            models.Index(fields=['role', 'size']),
+        ]
+
+    def __str__(self):
+        return self.path
+
+    @property
+    def absolute_path(self):
+        return Path(settings.BASE_STORAGE_DIR, self.package.refid, self.path)
+
+
+class DiscoveredPackage(models.Model):
+    """Package directory which has already been processed by discovery."""
+
+    refid = models.CharField(max_length=32, unique=True)
+    fingerprint = models.CharField(max_length=100)
+    last_modified = models.DateTimeField(auto_now=True)
+
+
+class Job(models.Model):
+    """Bulk action on a list of packages, processed in the background."""
+    QUEUED = 0
+    RUNNING = 1
+    COMPLETE = 9
+    FAILED = 5
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (COMPLETE, 'Complete'),
+        (FAILED, 'Failed'))
+    APPROVE = 'approve'
+    REJECT = 'reject'
+    ACTION_CHOICES = (
+        (APPROVE, 'Approve'),
+        (REJECT, 'Reject'))
+
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    status = models.IntegerField(choices=STATUS_CHOICES, default=QUEUED)
+    packages = models.ManyToManyField(Package, related_name='jobs')
+    rights_ids = models.CharField(max_length=100, null=True, blank=True)
+    processed_count = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    last_modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.get_action_display()} {self.packages.count()} packages'
+
+    @property
+    def is_active(self):
+        return self.status in [Job.QUEUED, Job.RUNNING]
+
+
 class RightsStatement(models.Model):
     """Rights statement stored in Aquila."""
 
@@ -0,0 +1,87 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from .images import get_technical_metadata, is_image
+from .models import Package
+
+QC_LEVELS = {'warn': Package.QC_WARN, 'fail': Package.QC_FAIL}
+
+
+def check_metadata(metadata, expectations):
+    """Compares an image's technical metadata against expectations.
+
+    Args:
+        metadata (dict): technical metadata, as returned by `get_technical_metadata`.
+        expectations (dict): expected values and the level (`warn` or `fail`)
+            at which a mismatch is flagged, keyed by check name. Checks with an
+            expected value of None are skipped.
+
+    Returns:
+        issues (list): dicts containing the check, level and a message for each failed check.
+    """
+    issues = []
+
+    def flag(check, message):
+        issues.append({'check': check, 'level': expectations[check]['level'], 'message': message})
+
+    def expected(check):
+        return expectations.get(check, {}).get('expected')
+
+    if expected('min_dpi') is not None:
+        if not metadata['dpi']:
+            flag('min_dpi', 'Resolution is not set')
+        elif min(metadata['dpi']) < expected('min_dpi'):
+            flag('min_dpi', f'Resolution is {min(metadata["dpi"]):g} DPI, expected at least {expected("min_dpi")}')
+    if expected('min_long_edge') is not None and max(metadata['width'], metadata['height']) < expected('min_long_edge'):
+        flag('min_long_edge', f'Long edge is {max(metadata["width"], metadata["height"])}px, expected at least {expected("min_long_edge")}px')
+    if expected('bit_depths') is not None and metadata['bit_depth'] not in expected('bit_depths'):
+        flag('bit_depths', f'Bit depth is {metadata["bit_depth"]}, expected one of {", ".join(str(depth) for depth in expected("bit_depths"))}')
+    if expected('compressions') is not None and metadata['compression'] not in expected('compressions'):
+        flag('compressions', f'Compression is {metadata["compression"]}, expected one of {", ".join(expected("compressions"))}')
+    if expected('icc_profile') and not metadata['icc_profile']:
+        flag('icc_profile', 'No embedded ICC profile')
+    return issues
+
+
+def check_file(source, expectations):
+    """Returns the technical metadata of an image and any QC issues found in it."""
+    try:
+        metadata = get_technical_metadata(source)
+    except Exception as e:
+        return None, [{'check': 'readable', 'level': 'fail', 'message': f'Unable to read image headers: {e}'}]
+    return metadata, check_metadata(metadata, expectations)
+
+
+def get_qc_status(issues):
+    """Returns the QC status for a list of issues, which is the most severe level flagged."""
+    return max([QC_LEVELS[issue['level']] for issue in issues], default=Package.QC_PASS)
+
+
+def run_qc_checks(package_files, workers=1):
+    """Checks image files in packages against the expectations in `settings.QC_CHECKS`.
+
+    Headers are read in a process pool. Technical metadata and issues are set
+    on each unsaved PackageFile, and QC statuses on their packages.
+
+    Args:
+        package_files (list): unsaved PackageFiles to check.
+        workers (int): number of processes used to read image headers.
+    """
+    images = [package_file for package_file in package_files if is_image(package_file.path)]
+    if not images:
+        return
+    expectations = settings.QC_CHECKS
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            check_file,
+            [package_file.absolute_path for package_file in images],
+            [expectations] * len(images),
+            chunksize=16)
+        for package_file, (metadata, issues) in zip(images, results):
+            package_file.technical_metadata = metadata
+            package_file.qc_issues = issues
+    packages = {id(package_file.package): package_file.package for package_file in images}
+    for package in packages.values():
+        package.qc_status = get_qc_status(
+            [issue for package_file in images if package_file.package is package for issue in package_file.qc_issues])
@@ -0,0 +1,23 @@
+// Polls progress of queued and running jobs, reloading the page once they finish
+
+document.addEventListener('DOMContentLoaded', function() {
+
+    const jobs = document.querySelectorAll('.job-progress[data-active=true]');
+
+    function poll(job) {
+        fetch(job.dataset.url)
+            .then(response => response.json())
+            .then(function(data) {
+                job.querySelector('.job-progress__status').textContent = `${data.status}, ${data.processed} of ${data.total} processed`
+                if (data.active) {
+                    setTimeout(poll, 2000, job)
+                } else {
+                    window.location.reload()
+                }
+            })
+    }
+
+    jobs.forEach(function(job) {
+        setTimeout(poll, 2000, job)
+    })
+});
@@ -0,0 +1,24 @@
+// Displays a zoomable image, loading only the tiles needed for the current view
+
+document.addEventListener('DOMContentLoaded', function() {
+
+    const viewer = document.getElementById('zoom-viewer')
+    const tileUrl = viewer.dataset.tileUrl.replace(/0\/0\/0\.jpg$/, '')
+
+    OpenSeadragon({
+        element: viewer,
+        prefixUrl: 'https://unpkg.com/openseadragon@4/build/openseadragon/images/',
+        showNavigator: true,
+        tileSources: {
+            width: parseInt(viewer.dataset.width),
+            height: parseInt(viewer.dataset.height),
+            tileSize: parseInt(viewer.dataset.tileSize),
+            tileOverlap: 0,
+            minLevel: 0,
+            maxLevel: parseInt(viewer.dataset.maxLevel),
+            getTileUrl: function(level, x, y) {
+                return `${tileUrl}${level}/${x}/${y}.jpg`
+            }
+        }
+    })
+});
@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
+
 from django import template
 
 register = template.Library()
@@ -6,3 +8,8 @@ register = template.Library()
 @register.filter
 def id_list(object_list):
     return ",".join([str(obj.pk) for obj in object_list])
+
+
+@register.filter
+def timestamp(value):
+    return datetime.fromtimestamp(value, tz=timezone.utc)
@@ -1,27 +1,58 @@
+import hashlib
 import json
+import os
 import random
 import shutil
+import tempfile
+import threading
+import time
+from base64 import urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+from importlib import import_module
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import boto3
+import numpy as np
+from asnake.client import ASnakeClient
+from django.apps import apps
 from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
 from django.shortcuts import reverse
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 from moto import mock_sns, mock_sqs, mock_ssm, mock_sts
 from moto.core import DEFAULT_ACCOUNT_ID
+from PIL import Image, ImageDraw
 
+from .analysis import estimate_skew, get_flags, get_page_statistics
 from .clients import ArchivesSpaceClient, AWSClient
-from .helpers import get_config
-from .management.commands import (check_qc_status, discover_packages,
-                                  fetch_rights_statements,
-                                  send_startup_message)
-from .models import Package, RightsStatement
+from .fixity import get_checksum, get_checksums
+from .helpers import (get_config, get_package_paths, invalidate_config,
+                      parse_range_header)
+from .images import (evict_cache, get_pyramid, get_technical_metadata,
+                     get_thumbnail, get_tile, to_8bit)
+from .management.commands import (analyse_images, check_fixity,
+                                  check_qc_status, discover_packages,
+                                  fetch_rights_statements, generate_thumbnails,
+                                  process_jobs, purge_quarantine,
+                                  refresh_package_data, send_startup_message)
+from .models import (DiscoveredPackage, Job, Package, PackageFile,
+                     RightsStatement)
+from .qc import check_file, check_metadata, get_qc_status
 
 FIXTURE_DIR = "fixtures"
 RIGHTS_DATA = [("1", "foo"), ("2", "bar")]
-PACKAGE_DATA = [("foo", "9ba10e5461d401517b0e1a53d514ec87", "9ba10e5461d401517b0e1a53d514ec87/\n----- 9ba10e5461d401517b0e1a53d514ec87_0001.pdf"),
-                ("bar", "f7d3dd6dc9c4732fa17dbd88fbe652b6", "f7d3dd6dc9c4732fa17dbd88fbe652b6/\n----- f7d3dd6dc9c4732fa17dbd88fbe652b6_0001.pdf")]
+PACKAGE_DATA = [
+    ("foo", "9ba10e5461d401517b0e1a53d514ec87", {
+        "name": "9ba10e5461d401517b0e1a53d514ec87", "mtime": 1700000000, "size": 1024, "file_count": 1,
+        "children": [{"name": "9ba10e5461d401517b0e1a53d514ec87_0001.pdf", "mtime": 1700000000, "size": 1024}]}),
+    ("bar", "f7d3dd6dc9c4732fa17dbd88fbe652b6", {
+        "name": "f7d3dd6dc9c4732fa17dbd88fbe652b6", "mtime": 1700000000, "size": 1024, "file_count": 1,
+        "children": [{"name": "f7d3dd6dc9c4732fa17dbd88fbe652b6_0001.pdf", "mtime": 1700000000, "size": 1024}]})]
 
 
 def create_rights_statements():
@@ -49,31 +80,64 @@ def copy_binaries():
             dirs_exist_ok=True)
 
 
+def create_package_files(package):
+    """Creates PackageFiles for images copied into place by `copy_binaries`."""
+    for path in sorted(Path(settings.BASE_STORAGE_DIR, package.refid).rglob('*.tif')):
+        relative_path = path.relative_to(Path(settings.BASE_STORAGE_DIR, package.refid))
+        PackageFile.objects.create(
+            package=package,
+            path=str(relative_path),
+            role=relative_path.parts[0],
+            size=path.stat().st_size,
+            mtime=datetime.fromtimestamp(int(path.stat().st_mtime), tz=UTC))
+
+
 class HelpersTests(TestCase):
 
+    def setUp(self):
+        self.path = "/dev/digitized-av-qc"
+        invalidate_config(self.path)
+
     @mock_ssm
     @patch('package_review.clients.AWSClient.get_client_with_role')
     def test_get_config(self, mock_client):
         """Asserts configs are properly fetched from SSM"""
         ssm = boto3.client('ssm', region_name='us-east-1')
         mock_client.return_value = ssm
-        path = "/dev/digitized-av-qc"
         for name, value in [("foo", "bar"), ("baz", "buzz")]:
             ssm.put_parameter(
-                Name=f"{path}/{name}",
+                Name=f"{self.path}/{name}",
                 Value=value,
                 Type="SecureString",
             )
-        config = get_config(path)
+        config = get_config(self.path)
         self.assertIsInstance(config, dict)
         self.assertEqual(config, {'foo': 'bar', 'baz': 'buzz'})
+        self.assertIsNone(cache.get(f'config:{self.path}'))
+
+    @mock_ssm
+    @patch('package_review.clients.AWSClient.get_client_with_role')
+    def test_get_config_pagination_and_cache(self, mock_client):
+        """Asserts all pages of parameters are fetched and then cached until invalidated."""
+        ssm = boto3.client('ssm', region_name='us-east-1')
+        mock_client.return_value = ssm
+        expected = {f"param{i}": str(i) for i in range(25)}
+        for name, value in expected.items():
+            ssm.put_parameter(Name=f"{self.path}/{name}", Value=value, Type="SecureString")
+        self.assertEqual(get_config(self.path), expected)
+        self.assertEqual(get_config(self.path), expected)
+        mock_client.assert_called_once()
+
+        invalidate_config(self.path)
+        get_config(self.path)
+        self.assertEqual(mock_client.call_count, 2)
 
 
 class ArchivesSpaceClientTests(TestCase):
 
-    @patch('asnake.aspace.ASpace.__init__')
-    def setUp(self, mock_init):
-        mock_init.return_value = None
+    @patch('package_review.clients.ASnakeClient')
+    def setUp(self, mock_client):
+        mock_client.return_value.authorize.return_value = 'token'
         self.as_client = ArchivesSpaceClient(
             username='admin',
             password='admin',
@@ -86,6 +150,28 @@ class ArchivesSpaceClientTests(TestCase):
             self.as_client.repository,
             '2')
 
+    @patch('package_review.clients.ASnakeClient')
+    def test_session_reuse(self, mock_client):
+        """Asserts stored session tokens are reused, and replaced when they expire."""
+        mock_client.return_value.authorize.return_value = 'new-token'
+        mock_client.return_value.config = {'session_header_name': 'X-ArchivesSpace-Session'}
+        mock_client.return_value.session.headers = {}
+        as_client = ArchivesSpaceClient(
+            username='admin',
+            password='admin',
+            baseurl='https://archivesspace.org/api',
+            repository='2')
+        mock_client.return_value.authorize.assert_not_called()
+        self.assertEqual(as_client.client.session.headers['X-ArchivesSpace-Session'], 'token')
+
+        expired, valid = Mock(status_code=412), Mock(status_code=200)
+        mock_client.return_value.get.side_effect = [expired, valid]
+        self.assertEqual(as_client._get('/repositories/2'), valid)
+        mock_client.return_value.authorize.assert_called_once()
+        self.assertEqual(cache.get(as_client.session_key), 'token')
+        as_client.save_session()
+        self.assertEqual(cache.get(as_client.session_key), 'new-token')
+
     def test_has_structured_dates(self):
         """Asserts presence of structured dates are parsed correctly."""
         for dates, expected in [
@@ -107,12 +193,111 @@ class ArchivesSpaceClientTests(TestCase):
             output = self.as_client.has_structured_dates(dates)
             self.assertEqual(output, expected)
 
+    def archival_object(self, refid):
+        return {
+            "_resolved": {
+                "ref_id": refid,
+                "uri": f"/repositories/2/archival_objects/{refid}",
+                "display_string": f"{refid} title",
+                "instances": [],
+                "dates": [{"begin": "1950", "date_type": "single"}],
+                "resource": {"ref": "/repositories/2/resources/1"}}}
+
+    def test_get_package_data_bulk(self):
+        """Asserts RefIDs are batched and results or errors are returned per RefID."""
+        self.as_client.client = Mock()
+        self.as_client.client.get.return_value.json.side_effect = [
+            {"archival_objects": [self.archival_object("foo"), self.archival_object("bar")]},
+            {"archival_objects": []},
+            {"title": "resource title", "uri": "/repositories/2/resources/1"}]
+        package_data = self.as_client.get_package_data_bulk(["foo", "bar", "baz"], batch_size=2)
+        self.assertEqual(self.as_client.client.get.call_count, 3)
+        self.assertEqual(
+            package_data["foo"],
+            ("foo title", "/repositories/2/archival_objects/foo", "resource title", "/repositories/2/resources/1", False, False))
+        self.assertEqual(package_data["bar"][0], "bar title")
+        self.assertIsInstance(package_data["baz"], Exception)
+
+    def test_get_package_data_bulk_workers(self):
+        """Asserts the cache is only used on the calling thread when requests are made in worker threads."""
+        self.as_client.client = Mock()
+        self.as_client.client.get.side_effect = lambda uri, **kwargs: Mock(
+            status_code=200,
+            json=Mock(return_value={"title": "resource title", "uri": uri} if 'resources' in uri else {"archival_objects": [self.archival_object(refid) for refid in kwargs['params']['ref_id[]']]}))
+        main_thread = threading.current_thread()
+        cache_threads = set()
+
+        def record_thread(method):
+            def wrapper(*args, **kwargs):
+                cache_threads.add(threading.current_thread())
+                return method(*args, **kwargs)
+            return wrapper
+
+        with patch.object(cache, 'get_many', record_thread(cache.get_many)), patch.object(cache, 'set_many', record_thread(cache.set_many)):
+            package_data = self.as_client.get_package_data_bulk([f"refid{idx}" for idx in range(10)], batch_size=2, workers=4)
+        self.assertEqual(cache_threads, {main_thread})
+        self.assertEqual(self.as_client.client.get.call_count, 6)
+        self.assertEqual(package_data["refid9"][2], "resource title")
+
+    def test_get_package_data_bulk_asnake(self):
+        """Asserts bulk lookups are accepted by ArchivesSnake, with only the HTTP session mocked."""
+        cache.set('archivesspace:session:https://archivesspace.org/api:admin', 'token')
+        as_client = ArchivesSpaceClient(
+            username='admin',
+            password='admin',
+            baseurl='https://archivesspace.org/api',
+            repository='2')
+        self.assertIsInstance(as_client.client, ASnakeClient)
+        with patch.object(as_client.client.session, 'get') as mock_get:
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.json.side_effect = [
+                {"archival_objects": [self.archival_object("foo"), self.archival_object("bar")]},
+                {"title": "resource title", "uri": "/repositories/2/resources/1"}]
+            package_data = as_client.get_package_data_bulk(["foo", "bar"])
+        self.assertEqual(package_data["foo"][0], "foo title")
+        self.assertEqual(package_data["bar"][0], "bar title")
+        self.assertEqual(
+            mock_get.call_args_list[0].kwargs['params'],
+            {'ref_id[]': ['foo', 'bar'], 'resolve[]': ['archival_objects']})
+
+    def test_get_package_data_cache(self):
+        """Asserts ArchivesSpace records are cached unless the cache is bypassed."""
+        resource = {"title": "resource title", "uri": "/repositories/2/resources/1"}
+        self.as_client.client = Mock()
+        self.as_client.client.get.return_value.json.side_effect = [
+            {"archival_objects": [self.archival_object("foo")]},
+            resource,
+            {"archival_objects": [self.archival_object("bar")]}]
+        self.as_client.get_package_data("foo")
+        self.assertEqual(self.as_client.client.get.call_count, 2)
+
+        self.assertEqual(self.as_client.get_package_data("foo")[0], "foo title")
+        self.assertEqual(self.as_client.get_package_data_bulk(["foo", "bar"])["bar"][2], "resource title")
+        self.assertEqual(self.as_client.client.get.call_count, 3)
+
+        self.as_client.client.get.return_value.json.side_effect = [
+            {"archival_objects": [self.archival_object("foo")]},
+            resource]
+        self.as_client.get_package_data("foo", use_cache=False)
+        self.assertEqual(self.as_client.client.get.call_count, 5)
+
 
 class AWSClientTests(TestCase):
 
     def setUp(self):
         create_packages()
 
+    @patch.dict('package_review.clients._aws_clients', clear=True)
+    @patch.dict('package_review.clients._aws_sessions', clear=True)
+    @patch('package_review.clients.assume_role')
+    def test_get_client_with_role(self, mock_assume_role):
+        """Asserts clients and assumed role sessions are shared."""
+        sns_client = AWSClient('sns', settings.AWS['role_arn'])
+        self.assertEqual(AWSClient('sns', settings.AWS['role_arn']).client, sns_client.client)
+        AWSClient('ssm', settings.AWS['role_arn'])
+        mock_assume_role.assert_called_once()
+        self.assertEqual(mock_assume_role.return_value.client.call_count, 2)
+
     @mock_sns
     @mock_sqs
     @mock_sts
@@ -146,6 +331,44 @@ class AWSClientTests(TestCase):
         self.assertEqual(message_body['MessageAttributes']['refid']['Value'], package.refid)
         self.assertEqual(message_body['MessageAttributes']['rights_ids']['Value'], "1,2")
 
+    @mock_sns
+    @mock_sqs
+    @mock_sts
+    @patch('package_review.clients.AWSClient.get_client_with_role')
+    def test_deliver_messages(self, mock_client):
+        sns = boto3.client('sns', region_name='us-east-1')
+        mock_client.return_value = sns
+        topic_arn = sns.create_topic(Name='my-topic')['TopicArn']
+        sqs_conn = boto3.resource("sqs", region_name="us-east-1")
+        sqs_conn.create_queue(QueueName="test-queue")
+        sns.subscribe(
+            TopicArn=topic_arn,
+            Protocol="sqs",
+            Endpoint=f"arn:aws:sqs:us-east-1:{DEFAULT_ACCOUNT_ID}:test-queue",
+            Attributes={"RawMessageDelivery": "false"})
+        for idx in range(23):
+            Package.objects.create(title=f"package {idx}", refid=f"refid{idx}", process_status=Package.PENDING)
+
+        client = AWSClient('sns', settings.AWS['role_arn'])
+        packages = Package.objects.all()
+        with patch.object(sns, 'publish_batch', wraps=sns.publish_batch) as mock_publish:
+            failed = client.deliver_messages(topic_arn, packages, "This is a message", "SUCCESS", rights_ids="1,2")
+        self.assertEqual(failed, [])
+        self.assertEqual(mock_publish.call_count, 3)
+
+        queue = sqs_conn.get_queue_by_name(QueueName="test-queue")
+        refids = set()
+        while True:
+            messages = queue.receive_messages(MaxNumberOfMessages=10)
+            if not messages:
+                break
+            for message in messages:
+                message_body = json.loads(message.body)
+                self.assertEqual(message_body['MessageAttributes']['outcome']['Value'], 'SUCCESS')
+                refids.add(message_body['MessageAttributes']['refid']['Value'])
+                message.delete()
+        self.assertEqual(refids, set(packages.values_list('refid', flat=True)))
+
 
 class DiscoverPackagesCommandTests(TestCase):
 
@@ -154,16 +377,78 @@ class DiscoverPackagesCommandTests(TestCase):
 
     def test_get_tree(self):
         for refid in ["9ba10e5461d401517b0e1a53d514ec87", "f7d3dd6dc9c4732fa17dbd88fbe652b6"]:
-            tree = discover_packages.Command()._get_dir_tree(Path("package_review", FIXTURE_DIR, "packages", refid))
-            self.assertIsInstance(tree, str)
-            self.assertIn(refid, tree)
-            self.assertIn('master', tree)
-            self.assertIn('master_edited', tree)
-            self.assertIn('service_edited', tree)
+            package_path = Path("package_review", FIXTURE_DIR, "packages", refid)
+            tree = discover_packages.Command()._get_dir_tree(package_path)
+            self.assertIsInstance(tree, dict)
+            self.assertEqual(tree['name'], refid)
+            self.assertEqual(
+                [child['name'] for child in tree['children']],
+                ['master', 'master_edited', 'service_edited'])
+            files = [f for f in package_path.rglob('*') if f.is_file()]
+            self.assertEqual(tree['file_count'], len(files))
+            self.assertEqual(tree['size'], sum(f.stat().st_size for f in files))
+            service_edited = tree['children'][2]
+            self.assertEqual(service_edited['children'][0]['name'], f'{refid}.pdf')
+            self.assertEqual(service_edited['children'][0]['size'], Path(package_path, 'service_edited', f'{refid}.pdf').stat().st_size)
+
+    def test_get_package_paths(self):
+        """Asserts hidden directories in the storage directory are not treated as packages."""
+        refids = sorted(path.stem for path in Path(settings.BASE_STORAGE_DIR).iterdir())
+        Path(settings.BASE_STORAGE_DIR, '.quarantine', 'foo').mkdir(parents=True)
+        self.assertEqual(sorted(get_package_paths()), refids)
+
+    def test_get_settled_paths(self):
+        """Asserts new directories are only returned once they stop changing."""
+        command = discover_packages.Command()
+        refids = sorted(path.stem for path in Path(settings.BASE_STORAGE_DIR).iterdir())
+        new_refid = refids[0]
+        seen = set(refids[1:])
+        settling = {}
+        self.assertEqual(command._get_settled_paths(seen, settling, 0, 30), {})
+        self.assertEqual(list(settling), [new_refid])
+        self.assertEqual(command._get_settled_paths(seen, settling, 20, 30), {})
+
+        Path(settings.BASE_STORAGE_DIR, new_refid, 'master', 'new_file.tif').write_bytes(b'new')
+        self.assertEqual(command._get_settled_paths(seen, settling, 40, 30), {})
+        self.assertEqual(
+            command._get_settled_paths(seen, settling, 70, 30),
+            {new_refid: Path(settings.BASE_STORAGE_DIR, new_refid)})
+        self.assertEqual(settling, {})
+        self.assertNotIn(new_refid, seen)
 
     @mock_sts
+    @patch('package_review.management.commands.discover_packages.close_old_connections')
+    @patch('package_review.management.commands.discover_packages.time.sleep')
     @patch('package_review.clients.ArchivesSpaceClient.__init__')
-    @patch('package_review.clients.ArchivesSpaceClient.get_package_data')
+    @patch('package_review.clients.ArchivesSpaceClient.get_package_data_bulk')
+    @patch('package_review.clients.AWSClient.deliver_message')
+    @patch('package_review.clients.AWSClient.get_client_with_role')
+    def test_watch(self, mock_client, mock_message, mock_package_data, mock_init, mock_sleep, mock_close):
+        """Asserts directories which fail discovery are only retried once they change, and then ignored."""
+        refids = sorted(path.stem for path in Path(settings.BASE_STORAGE_DIR).iterdir())
+        changed_refid = refids[0]
+        mock_init.return_value = None
+        package_data = {refid: Exception("foo") for refid in refids}
+        mock_package_data.side_effect = lambda refids, batch_size, workers: {refid: package_data[refid] for refid in refids}
+
+        def sleep(interval):
+            if mock_sleep.call_count == 5:
+                package_data.update({refid: ('object_title', 'object_uri', 'resource_title', 'resource_uri', False, False) for refid in refids})
+                Path(settings.BASE_STORAGE_DIR, changed_refid, 'master', 'new_file.tif').write_bytes(b'new')
+            elif mock_sleep.call_count == 10:
+                raise KeyboardInterrupt
+        mock_sleep.side_effect = sleep
+
+        with self.assertRaises(KeyboardInterrupt):
+            discover_packages.Command().watch(discover_packages.ArchivesSpaceClient(), 0, 0)
+        self.assertEqual(mock_close.call_count, 10)
+        self.assertEqual(mock_package_data.call_count, 2)
+        self.assertEqual(mock_message.call_count, len(refids))
+        self.assertEqual(list(Package.objects.filter(process_status=Package.PENDING).values_list('refid', flat=True)), [changed_refid])
+
+    @mock_sts
+    @patch('package_review.clients.ArchivesSpaceClient.__init__')
+    @patch('package_review.clients.ArchivesSpaceClient.get_package_data_bulk')
     @patch('package_review.clients.AWSClient.deliver_message')
     @patch('package_review.clients.AWSClient.get_client_with_role')
     @patch('package_review.management.commands.discover_packages.get_config')
@@ -171,33 +456,115 @@ class DiscoverPackagesCommandTests(TestCase):
         """Asserts cron produces expected results."""
         expected_len = len(list(Path(settings.BASE_STORAGE_DIR).iterdir()))
         mock_init.return_value = None
-        mock_package_data.return_value = 'object_title', 'object_uri', 'resource_title', 'resource_uri', False, False
+        mock_package_data.side_effect = lambda refids, batch_size, workers: {refid: ('object_title', 'object_uri', 'resource_title', 'resource_uri', False, False) for refid in refids}
 
         discover_packages.Command().handle()
         mock_config.assert_called_once()
         mock_init.assert_called_once()
         mock_client.assert_not_called()
         mock_message.assert_not_called()
-        self.assertEqual(mock_package_data.call_count, expected_len)
+        mock_package_data.assert_called_once()
         self.assertEqual(Package.objects.all().count(), expected_len)
-        discover_packages.Command().handle()
+        self.assertEqual(
+            PackageFile.objects.all().count(),
+            len([f for f in Path(settings.BASE_STORAGE_DIR).rglob('*') if f.is_file()]))
+        for package in Package.objects.all():
+            self.assertEqual(package.files.filter(role=PackageFile.MASTER).count(), 2)
+            self.assertEqual(package.files.filter(role=PackageFile.SERVICE_EDITED).get().path, f'service_edited/{package.refid}.pdf')
+            self.assertEqual(package.qc_status, Package.QC_FAIL)
+            master = package.files.filter(role=PackageFile.MASTER).first()
+            self.assertEqual(master.technical_metadata['dpi'], [72.0, 72.0])
+            self.assertIn('min_dpi', [issue['check'] for issue in master.qc_issues])
+            self.assertIsNone(package.files.filter(role=PackageFile.SERVICE_EDITED).get().technical_metadata)
+            self.assertFalse(package.files.exclude(checksum='').exists())
+        with self.assertNumQueries(2):
+            discover_packages.Command().handle()
         mock_message.assert_not_called()
+        self.assertEqual(Package.objects.all().count(), expected_len)
+
+    @mock_sts
+    @patch('package_review.clients.ArchivesSpaceClient.__init__')
+    @patch('package_review.clients.ArchivesSpaceClient.get_package_data_bulk')
+    @patch('package_review.clients.AWSClient.get_client_with_role')
+    @patch('package_review.management.commands.discover_packages.get_config')
+    def test_handle_discovered(self, mock_config, mock_client, mock_package_data, mock_init):
+        """Asserts processed packages are only rediscovered when their contents change."""
+        expected_len = len(list(Path(settings.BASE_STORAGE_DIR).iterdir()))
+        mock_init.return_value = None
+        mock_package_data.side_effect = lambda refids, batch_size, workers: {refid: ('object_title', 'object_uri', 'resource_title', 'resource_uri', False, False) for refid in refids}
+
+        discover_packages.Command().handle()
+        self.assertEqual(DiscoveredPackage.objects.all().count(), expected_len)
+        Package.objects.all().update(process_status=Package.APPROVED)
+
+        discover_packages.Command().handle()
+        self.assertEqual(Package.objects.all().count(), expected_len)
+
+        refid = Package.objects.first().refid
+        Path(settings.BASE_STORAGE_DIR, refid, 'master', 'new_file.tif').write_bytes(b'new')
+        discover_packages.Command().handle()
+        self.assertEqual(Package.objects.all().count(), expected_len + 1)
+        self.assertEqual(Package.objects.filter(refid=refid, process_status=Package.PENDING).count(), 1)
+
+    @mock_sts
+    @patch('package_review.clients.ArchivesSpaceClient.__init__')
+    @patch('package_review.clients.ArchivesSpaceClient.get_package_data_bulk')
+    @patch('package_review.clients.AWSClient.get_client_with_role')
+    @patch('package_review.management.commands.discover_packages.get_config')
+    def test_backfill_discovered(self, mock_config, mock_client, mock_package_data, mock_init):
+        """Asserts directories of packages created before discovery was recorded are not rediscovered."""
+        refids = sorted(path.stem for path in Path(settings.BASE_STORAGE_DIR).iterdir())
+        processed_refid = refids[0]
+        mock_init.return_value = None
+        mock_package_data.side_effect = lambda refids, batch_size, workers: {refid: ('object_title', 'object_uri', 'resource_title', 'resource_uri', False, False) for refid in refids}
+        Package.objects.create(title='foo', refid=processed_refid, process_status=Package.APPROVED)
+
+        import_module('package_review.migrations.0007_discoveredpackage').backfill_discovered_packages(apps, None)
+        self.assertEqual(list(DiscoveredPackage.objects.values_list('refid', flat=True)), [processed_refid])
+        self.assertEqual(
+            DiscoveredPackage.objects.get().fingerprint,
+            discover_packages.Command()._get_fingerprint(Path(settings.BASE_STORAGE_DIR, processed_refid)))
+
+        discover_packages.Command().handle()
+        self.assertEqual(Package.objects.filter(refid=processed_refid).count(), 1)
+        self.assertEqual(Package.objects.filter(process_status=Package.PENDING).count(), len(refids) - 1)
 
     @mock_sns
     @mock_sts
     @patch('package_review.clients.ArchivesSpaceClient.__init__')
-    @patch('package_review.clients.ArchivesSpaceClient.get_package_data')
+    @patch('package_review.clients.ArchivesSpaceClient.get_package_data_bulk')
     @patch('package_review.clients.AWSClient.deliver_message')
     @patch('package_review.clients.AWSClient.get_client_with_role')
     @patch('package_review.helpers.get_config')
     def test_handle_exception(self, mock_config, mock_client, mock_message, mock_package_data, mock_init):
         """Asserts exceptions while processing packages are handled as expected."""
         expected_len = len(list(Path(settings.BASE_STORAGE_DIR).iterdir()))
-        mock_package_data.side_effect = Exception("foo")
+        mock_package_data.side_effect = lambda refids, batch_size, workers: {refid: Exception("foo") for refid in refids}
         mock_init.return_value = None
         discover_packages.Command().handle()
         self.assertEqual(mock_message.call_count, expected_len)
 
+    @mock_sts
+    @patch('package_review.clients.ArchivesSpaceClient.__init__')
+    @patch('package_review.clients.ArchivesSpaceClient.get_package_data_bulk')
+    @patch('package_review.clients.AWSClient.deliver_message')
+    @patch('package_review.clients.AWSClient.get_client_with_role')
+    @patch('package_review.management.commands.discover_packages.get_config')
+    def test_handle_workers(self, mock_config, mock_client, mock_message, mock_package_data, mock_init):
+        """Asserts packages are discovered and errors reported when using a thread pool."""
+        refids = [path.stem for path in Path(settings.BASE_STORAGE_DIR).iterdir()]
+        failed_refid = refids[0]
+        mock_init.return_value = None
+        mock_package_data.side_effect = lambda refids, batch_size, workers: {
+            refid: Exception("foo") if refid == failed_refid else ('object_title', 'object_uri', 'resource_title', 'resource_uri', False, False)
+            for refid in refids}
+
+        discover_packages.Command().handle(workers=4)
+        mock_message.assert_called_once()
+        self.assertEqual(mock_message.call_args[0][2], f'Error discovering refid {failed_refid}')
+        self.assertEqual(Package.objects.all().count(), len(refids) - 1)
+        self.assertFalse(Package.objects.filter(refid=failed_refid).exists())
+
     def tearDown(self):
         for dir in Path(settings.BASE_STORAGE_DIR).iterdir():
             shutil.rmtree(dir)
@@ -212,6 +579,7 @@ class CheckQCStatusCommandTests(TestCase):
     def test_qc_done(self, mock_client, mock_message):
         for dir in Path(settings.BASE_STORAGE_DIR).iterdir():
             shutil.rmtree(dir)
+        Path(settings.BASE_STORAGE_DIR, '.quarantine').mkdir()
         check_qc_status.Command().handle()
         mock_message.assert_called_once_with(
             settings.AWS['sns_topic'],
@@ -278,6 +646,13 @@ class ViewMixinTests(TestCase):
         response = self.client.get(reverse('package-bulk-approve'))
         self.assertEqual(len(RIGHTS_DATA), len(response.context['rights_statements']))
 
+    def test_detail_tree(self):
+        """Asserts structured package trees are rendered in the detail view."""
+        package = random.choice(Package.objects.all())
+        response = self.client.get(reverse('package-detail', args=[package.pk]))
+        self.assertContains(response, f'{package.refid}_0001.pdf')
+        self.assertContains(response, '1 file, 1.0\xa0KB')
+
     def test_bulk_action_list_mixin(self):
         """Asserts objects are fetched from URL params."""
         form_data = "&".join([f'{str(obj.pk)}=on' for obj in Package.objects.all()])
@@ -286,43 +661,354 @@ class ViewMixinTests(TestCase):
             self.assertEqual(Package.objects.all().count(), len(response.context['object_list']))
 
 
+class PackageModelTests(TestCase):
+
+    def test_unique_pending_refid(self):
+        """Asserts only one pending package can exist for a RefID."""
+        Package.objects.create(title="foo", refid="foo", process_status=Package.APPROVED)
+        Package.objects.create(title="foo", refid="foo", process_status=Package.PENDING)
+        Package.objects.bulk_create([Package(title="foo", refid="foo", process_status=Package.PENDING)], ignore_conflicts=True)
+        self.assertEqual(Package.objects.filter(refid="foo").count(), 2)
+        with self.assertRaises(IntegrityError):
+            Package.objects.create(title="foo", refid="foo", process_status=Package.PENDING)
+
+
+class PackageRefidConstraintMigrationTests(TransactionTestCase):
+
+    def test_duplicate_pending_packages(self):
+        """Asserts only the newest pending package for a RefID is kept when the constraint is added."""
+        executor = MigrationExecutor(connection)
+        executor.migrate([('package_review', '0011_package_sort_indexes')])
+        OldPackage = executor.loader.project_state([('package_review', '0011_package_sort_indexes')]).apps.get_model('package_review', 'Package')
+        approved = OldPackage.objects.create(title="foo", refid="foo", process_status=Package.APPROVED)
+        OldPackage.objects.create(title="foo", refid="foo", process_status=Package.PENDING)
+        newest = OldPackage.objects.create(title="foo", refid="foo", process_status=Package.PENDING)
+        other = OldPackage.objects.create(title="bar", refid="bar", process_status=Package.PENDING)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        self.assertEqual(
+            sorted(Package.objects.values_list('pk', flat=True)),
+            sorted([approved.pk, newest.pk, other.pk]))
+
+
+class PackageListViewTests(TestCase):
+
+    def setUp(self):
+        create_packages()
+        Package.objects.filter(title="foo").update(resource_title="Rockefeller Family")
+
+    def test_search(self):
+        """Asserts packages are filtered by title, collection title or RefID."""
+        for query, expected in [
+            ("", ["foo", "bar"]),
+            ("FO", ["foo"]),
+            ("family", ["foo"]),
+            ("f7d3dd6d", ["bar"]),
+            ("baz", []),
+        ]:
+            response = self.client.get(reverse('package-list'), {'q': query})
+            self.assertEqual(sorted(package.title for package in response.context['object_list']), sorted(expected))
+            self.assertEqual(response.context['query'], query)
+        self.assertContains(response, 'No files to QC match "baz"')
+
+
+class PackageListPaginationTests(TestCase):
+
+    def setUp(self):
+        for title in ["e", "a", "d", "b", "c"]:
+            Package.objects.create(title=title, refid=title, tree={"name": title, "children": []}, process_status=Package.PENDING)
+
+    def titles(self, response):
+        return [package.title for package in response.context['object_list']]
+
+    @patch('package_review.views.PackageListView.page_size', 2)
+    def test_pagination(self):
+        """Asserts pages are navigated forwards and backwards using cursors."""
+        response = self.client.get(reverse('package-list'))
+        self.assertEqual(self.titles(response), ["a", "b"])
+        self.assertIsNone(response.context['previous_cursor'])
+        self.assertIn('tree', response.context['object_list'][0].get_deferred_fields())
+
+        response = self.client.get(reverse('package-list'), {'after': response.context['next_cursor']})
+        self.assertEqual(self.titles(response), ["c", "d"])
+        response = self.client.get(reverse('package-list'), {'after': response.context['next_cursor']})
+        self.assertEqual(self.titles(response), ["e"])
+        self.assertIsNone(response.context['next_cursor'])
+
+        response = self.client.get(reverse('package-list'), {'before': response.context['previous_cursor']})
+        self.assertEqual(self.titles(response), ["c", "d"])
+        response = self.client.get(reverse('package-list'), {'before': response.context['previous_cursor']})
+        self.assertEqual(self.titles(response), ["a", "b"])
+        self.assertIsNone(response.context['previous_cursor'])
+
+    @patch('package_review.views.PackageListView.page_size', 2)
+    def test_sort(self):
+        """Asserts packages are sorted on the server."""
+        response = self.client.get(reverse('package-list'), {'sort': '-title'})
+        self.assertEqual(self.titles(response), ["e", "d"])
+        response = self.client.get(reverse('package-list'), {'sort': '-title', 'after': response.context['next_cursor']})
+        self.assertEqual(self.titles(response), ["c", "b"])
+        response = self.client.get(reverse('package-list'), {'sort': 'tree'})
+        self.assertEqual(response.context['sort'], 'title')
+        response = self.client.get(reverse('package-list'), {'after': 'invalid'})
+        self.assertEqual(self.titles(response), ["a", "b"])
+
+    @patch('package_review.views.PackageListView.page_size', 2)
+    def test_invalid_cursor(self):
+        """Asserts cursors whose values do not match the sort field return the first page."""
+        for sort, cursor in [
+                ('title', [["a"], 1]),
+                ('title', [{"a": 1}, 1]),
+                ('title', ["a", "1"]),
+                ('qc_status', ["a", 1]),
+                ('qc_status', [True, 1]),
+                ('undated_object', [0, 1])]:
+            after = urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+            response = self.client.get(reverse('package-list'), {'sort': sort, 'after': after})
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.context['previous_cursor'])
+
+
 class PackageActionViewTests(TestCase):
 
     def setUp(self):
         create_rights_statements()
         create_packages()
         copy_binaries()
+        self.quarantine_dir = Path(tempfile.mkdtemp())
+        self.override = override_settings(QUARANTINE_DIR=self.quarantine_dir)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.quarantine_dir)
+        for dir in Path(settings.BASE_STORAGE_DIR).iterdir():
+            shutil.rmtree(dir)
 
     @patch('package_review.clients.AWSClient.__init__')
-    @patch('package_review.clients.AWSClient.deliver_message')
+    @patch('package_review.clients.AWSClient.deliver_messages')
     def test_approve_view(self, mock_deliver, mock_init):
         mock_init.return_value = None
+        mock_deliver.return_value = []
         pkg_list = ",".join([str(obj.id) for obj in Package.objects.all()])
         rights_list = ",".join([str(obj.id) for obj in RightsStatement.objects.all()])
         response = self.client.post(f'{reverse("package-approve")}?object_list={pkg_list}&rights_ids={rights_list}')
-        self.assertEqual(mock_deliver.call_count, Package.objects.all().count())
+        job = Job.objects.get()
+        self.assertEqual(job.action, Job.APPROVE)
+        self.assertEqual(job.packages.count(), Package.objects.all().count())
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, f"{reverse('package-list')}?job={job.pk}")
+        mock_deliver.assert_not_called()
+        response = self.client.get(response.url)
+        self.assertEqual(len(response.context['object_list']), 0)
+        self.assertEqual(list(response.context['jobs']), [job])
+
+        process_jobs.Command().handle()
+        mock_deliver.assert_called_once()
+        self.assertEqual(len(mock_deliver.call_args[0][1]), Package.objects.all().count())
         for package in Package.objects.all():
             self.assertEqual(package.process_status, Package.APPROVED)
             self.assertEqual(package.rights_ids, rights_list)
         self.assertEqual(len(list(Path(settings.BASE_STORAGE_DIR).iterdir())), Package.objects.all().count())
-        self.assertEqual(response.status_code, 302)
-        self.assertEqual(response.url, reverse('package-list'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.COMPLETE)
+        self.assertEqual(job.processed_count, Package.objects.all().count())
+
+    def test_concurrent_actions(self):
+        """Asserts packages can only be queued by one action at a time."""
+        pkg_list = ",".join([str(obj.id) for obj in Package.objects.all()])
+        self.client.post(f'{reverse("package-approve")}?object_list={pkg_list}&rights_ids=1')
+        response = self.client.post(f'{reverse("package-reject")}?object_list={pkg_list}', follow=True)
+        self.assertEqual(Job.objects.all().count(), 1)
+        self.assertContains(response, 'The selected packages have already been approved or rejected.')
+
+    def test_claimed_packages(self):
+        """Asserts packages are claimed by the column on the locked rows, and released when the job finishes."""
+        pkg_list = ",".join([str(obj.id) for obj in Package.objects.all()])
+        self.client.post(f'{reverse("package-approve")}?object_list={pkg_list}&rights_ids=1')
+        job = Job.objects.get()
+        self.assertEqual(Package.objects.filter(active_job=job).count(), Package.objects.all().count())
+
+        job.packages.clear()
+        self.client.post(f'{reverse("package-reject")}?object_list={pkg_list}')
+        self.assertEqual(Job.objects.all().count(), 1)
+
+        with patch('package_review.management.commands.process_jobs.AWSClient') as mock_client:
+            mock_client.return_value.deliver_messages.return_value = []
+            process_jobs.Command().process(job)
+        self.assertFalse(Package.objects.filter(active_job__isnull=False).exists())
 
     @patch('package_review.clients.AWSClient.__init__')
-    @patch('package_review.clients.AWSClient.deliver_message')
-    def test_reject_view(self, mock_delete, mock_init):
+    @patch('package_review.clients.AWSClient.deliver_messages')
+    def test_job_status_queries(self, mock_deliver, mock_init):
+        """Asserts package statuses are updated with a constant number of queries."""
+        mock_init.return_value = None
+        mock_deliver.return_value = []
+        for idx in range(10):
+            Package.objects.create(title=f"package {idx}", refid=f"refid{idx}", process_status=Package.PENDING)
+        job = Job.objects.create(action=Job.APPROVE, rights_ids="1")
+        job.packages.set(Package.objects.all())
+        Package.objects.all().update(active_job=job)
+        batch = list(Package.objects.all())
+        with self.assertNumQueries(4):
+            process_jobs.Command()._process_batch(job, AWSClient('sns', settings.AWS['role_arn']), batch)
+        self.assertEqual(Package.objects.filter(process_status=Package.APPROVED).count(), len(batch))
+
+    @patch('package_review.clients.AWSClient.__init__')
+    @patch('package_review.clients.AWSClient.deliver_messages')
+    def test_job_delivery_failure(self, mock_deliver, mock_init):
+        """Asserts packages whose messages could not be delivered remain pending and errors are recorded."""
+        mock_init.return_value = None
+        failed_package = Package.objects.first()
+        mock_deliver.return_value = [(failed_package, 'Internal error')]
+        pkg_list = ",".join([str(obj.id) for obj in Package.objects.all()])
+        self.client.post(f'{reverse("package-approve")}?object_list={pkg_list}&rights_ids=1')
+        process_jobs.Command().handle()
+        failed_package.refresh_from_db()
+        self.assertEqual(failed_package.process_status, Package.PENDING)
+        self.assertEqual(Package.objects.filter(process_status=Package.APPROVED).count(), Package.objects.all().count() - 1)
+
+        job = Job.objects.get()
+        response = self.client.get(reverse('job-detail', args=[job.pk]))
+        self.assertEqual(response.json(), {
+            'status': 'Complete',
+            'active': False,
+            'processed': Package.objects.all().count(),
+            'total': Package.objects.all().count(),
+            'errors': [{'refid': failed_package.refid, 'error': 'Internal error'}]})
+        response = self.client.get(f"{reverse('package-list')}?job={job.pk}")
+        self.assertContains(response, f'{failed_package.refid}: Internal error')
+
+    @patch('package_review.clients.AWSClient.__init__')
+    @patch('package_review.clients.AWSClient.deliver_messages')
+    def test_stale_jobs(self, mock_deliver, mock_init):
+        """Asserts running jobs which stopped making progress are requeued and completed."""
+        mock_init.return_value = None
+        mock_deliver.return_value = []
+        stale, running = Package.objects.order_by('pk')
+        for package in [stale, running]:
+            job = Job.objects.create(action=Job.APPROVE, rights_ids="1", status=Job.RUNNING)
+            job.packages.set([package])
+            Package.objects.filter(pk=package.pk).update(active_job=job)
+        stale_job, running_job = Job.objects.order_by('pk')
+        Job.objects.filter(pk=stale_job.pk).update(last_modified=timezone.now() - timedelta(hours=1))
+
+        process_jobs.Command().handle(stale_after=600)
+        stale_job.refresh_from_db()
+        running_job.refresh_from_db()
+        self.assertEqual(stale_job.status, Job.COMPLETE)
+        self.assertEqual(running_job.status, Job.RUNNING)
+        self.assertEqual(Package.objects.get(pk=stale.pk).process_status, Package.APPROVED)
+        self.assertEqual(Package.objects.get(pk=running.pk).process_status, Package.PENDING)
+
+    @patch('package_review.clients.AWSClient.__init__')
+    @patch('package_review.clients.AWSClient.deliver_messages')
+    def test_reject_delivery_failure(self, mock_deliver, mock_init):
+        """Asserts files of rejected packages whose messages could not be delivered are moved back."""
+        mock_init.return_value = None
+        failed_package = Package.objects.first()
+        mock_deliver.return_value = [(failed_package, 'Internal error')]
+        pkg_list = ",".join([str(obj.id) for obj in Package.objects.all()])
+        self.client.post(f'{reverse("package-reject")}?object_list={pkg_list}')
+        process_jobs.Command().handle()
+        failed_package.refresh_from_db()
+        self.assertEqual(failed_package.process_status, Package.PENDING)
+        self.assertIsNone(failed_package.active_job)
+        self.assertEqual([path.name for path in Path(settings.BASE_STORAGE_DIR).iterdir()], [failed_package.refid])
+        self.assertEqual(len(list(self.quarantine_dir.iterdir())), Package.objects.all().count() - 1)
+
+    @patch('package_review.clients.AWSClient.__init__')
+    @patch('package_review.clients.AWSClient.deliver_messages')
+    def test_reject_delivery_exception(self, mock_deliver, mock_init):
+        """Asserts files of rejected packages are moved back when delivering messages raises."""
         mock_init.return_value = None
+        mock_deliver.side_effect = Exception('Throttled')
+        refids = sorted(Package.objects.values_list('refid', flat=True))
+        pkg_list = ",".join([str(obj.id) for obj in Package.objects.all()])
+        self.client.post(f'{reverse("package-reject")}?object_list={pkg_list}')
+        process_jobs.Command().handle()
+        self.assertEqual(Package.objects.filter(process_status=Package.PENDING).count(), len(refids))
+        self.assertEqual(sorted(path.name for path in Path(settings.BASE_STORAGE_DIR).iterdir()), refids)
+        self.assertEqual(list(self.quarantine_dir.iterdir()), [])
+        self.assertEqual(len(Job.objects.get().errors), len(refids))
+
+    @patch('package_review.clients.AWSClient.__init__')
+    @patch('package_review.clients.AWSClient.deliver_messages')
+    def test_reject_other_filesystem(self, mock_deliver, mock_init):
+        """Asserts packages are not quarantined when the quarantine directory is on another filesystem."""
+        mock_init.return_value = None
+        mock_deliver.return_value = []
+        stat = Path.stat
+
+        def other_filesystem_stat(path, *args, **kwargs):
+            result = stat(path, *args, **kwargs)
+            return os.stat_result((*result[:2], result.st_dev + 1, *result[3:])) if path == self.quarantine_dir else result
+
+        pkg_list = ",".join([str(obj.id) for obj in Package.objects.all()])
+        self.client.post(f'{reverse("package-reject")}?object_list={pkg_list}')
+        with patch.object(Path, 'stat', autospec=True, side_effect=other_filesystem_stat):
+            process_jobs.Command().handle()
+        mock_deliver.assert_not_called()
+        job = Job.objects.get()
+        self.assertEqual(len(job.errors), Package.objects.all().count())
+        self.assertIn('not on the same filesystem', job.errors[0]['error'])
+        self.assertEqual(Package.objects.filter(process_status=Package.PENDING).count(), Package.objects.all().count())
+        self.assertEqual(list(self.quarantine_dir.iterdir()), [])
+
+    @patch('package_review.clients.AWSClient.__init__')
+    @patch('package_review.clients.AWSClient.deliver_messages')
+    def test_job_skips_handled_packages(self, mock_deliver, mock_init):
+        """Asserts no files are moved or messages sent for packages which are no longer pending."""
+        mock_init.return_value = None
+        mock_deliver.return_value = []
+        pkg_list = ",".join([str(obj.id) for obj in Package.objects.all()])
+        self.client.post(f'{reverse("package-reject")}?object_list={pkg_list}')
+        handled = Package.objects.first()
+        Package.objects.filter(pk=handled.pk).update(process_status=Package.APPROVED)
+        process_jobs.Command().handle()
+        self.assertNotIn(handled.pk, [package.pk for package in mock_deliver.call_args[0][1]])
+        self.assertTrue(Path(settings.BASE_STORAGE_DIR, handled.refid).exists())
+
+    @patch('package_review.clients.AWSClient.__init__')
+    @patch('package_review.clients.AWSClient.deliver_messages')
+    def test_reject_view(self, mock_deliver, mock_init):
+        mock_init.return_value = None
+        mock_deliver.return_value = []
         pkg_list = ",".join([str(obj.id) for obj in Package.objects.all()])
         response = self.client.post(f'{reverse("package-reject")}?object_list={pkg_list}')
-        self.assertEqual(mock_delete.call_count, Package.objects.all().count())
+        job = Job.objects.get()
+        self.assertEqual(job.action, Job.REJECT)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, f"{reverse('package-list')}?job={job.pk}")
+
+        process_jobs.Command().handle()
+        mock_deliver.assert_called_once()
+        self.assertEqual(len(mock_deliver.call_args[0][1]), Package.objects.all().count())
         for package in Package.objects.all():
             self.assertEqual(package.process_status, Package.REJECTED)
         self.assertTrue(len(list(Path(settings.BASE_STORAGE_DIR).iterdir())) == 0)
-        self.assertEqual(response.status_code, 302)
-        self.assertEqual(response.url, reverse('package-list'))
+        quarantined = sorted(self.quarantine_dir.iterdir())
+        self.assertEqual(
+            [path.name.split('.')[0] for path in quarantined],
+            sorted(Package.objects.values_list('refid', flat=True)))
+
+        purge_quarantine.Command().handle(retention_days=1)
+        self.assertEqual(sorted(self.quarantine_dir.iterdir()), quarantined)
+        expired = quarantined[0]
+        os.utime(expired, (time.time() - 2 * 86400, time.time() - 2 * 86400))
+        purge_quarantine.Command().handle(retention_days=1)
+        self.assertEqual(sorted(self.quarantine_dir.iterdir()), quarantined[1:])
+
+        Path(self.quarantine_dir, 'foo.1').mkdir()
+        for path in self.quarantine_dir.iterdir():
+            os.utime(path, (time.time() - 2 * 86400, time.time() - 2 * 86400))
+        with patch.object(purge_quarantine.Command, 'purge', autospec=True, side_effect=[OSError('foo'), None]) as mock_purge:
+            purge_quarantine.Command().handle(retention_days=1)
+        self.assertEqual(mock_purge.call_count, 2)
 
     @patch('package_review.clients.ArchivesSpaceClient.__init__')
-    @patch('package_review.clients.ArchivesSpaceClient.get_package_data')
+    @patch('package_review.clients.ArchivesSpaceClient.get_package_data_bulk')
     @patch('package_review.views.get_config')
     def test_refresh_view(self, mock_config, mock_data, mock_init):
         mock_init.return_value = None
@@ -332,10 +1018,12 @@ class PackageActionViewTests(TestCase):
         resource_uri = "/repositories/2/resources/1"
         undated_object = True
         already_digitized = False
-        mock_data.return_value = title, object_uri, resource_title, resource_uri, undated_object, already_digitized
+        mock_data.side_effect = lambda refids, batch_size, use_cache, workers: {
+            refid: (title, object_uri, resource_title, resource_uri, undated_object, already_digitized) for refid in refids}
         package = random.choice(Package.objects.all())
         response = self.client.get(f'{reverse("refresh-data")}?object_list={package.id}')
         package.refresh_from_db()
+        mock_data.assert_called_once_with([package.refid], batch_size=25, use_cache=False, workers=1)
         self.assertEqual(package.title, title)
         self.assertEqual(package.uri, object_uri)
         self.assertEqual(package.resource_title, resource_title)
@@ -345,6 +1033,424 @@ class PackageActionViewTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertEqual(response.url, reverse('package-detail', kwargs={'pk': package.pk}))
 
+        mock_data.reset_mock()
+        response = self.client.get(f'{reverse("refresh-data")}?object_list=0')
+        self.assertEqual(response.status_code, 404)
+        mock_data.assert_not_called()
+
+    @patch('package_review.clients.ArchivesSpaceClient.__init__')
+    @patch('package_review.clients.ArchivesSpaceClient.get_package_data_bulk')
+    @patch('package_review.views.get_config')
+    def test_bulk_refresh_view(self, mock_config, mock_data, mock_init):
+        mock_init.return_value = None
+        failed_package = Package.objects.first()
+        mock_data.side_effect = lambda refids, batch_size, use_cache, workers: {
+            refid: Exception("foo") if refid == failed_package.refid else ("title", "uri", "resource title", "resource uri", False, False)
+            for refid in refids}
+        form_data = "&".join([f'{str(obj.pk)}=on' for obj in Package.objects.all()])
+        response = self.client.get(f'{reverse("bulk-refresh-data")}?{form_data}', follow=True)
+        self.assertContains(response, f'Unable to refresh data for {failed_package.refid}: foo')
+        self.assertContains(response, f'Refreshed ArchivesSpace data for {Package.objects.all().count() - 1} packages, of which {Package.objects.all().count() - 1} changed.')
+        self.assertEqual(Package.objects.filter(title="title").count(), Package.objects.all().count() - 1)
+
+
+class RefreshPackageDataCommandTests(TestCase):
+
+    def setUp(self):
+        create_packages()
+
+    @patch('package_review.clients.ArchivesSpaceClient.__init__')
+    @patch('package_review.clients.ArchivesSpaceClient.get_package_data_bulk')
+    @patch('package_review.management.commands.refresh_package_data.get_config')
+    def test_handle(self, mock_config, mock_data, mock_init):
+        """Asserts only packages whose data changed are updated."""
+        mock_init.return_value = None
+        unchanged, changed = Package.objects.order_by('pk')
+        mock_data.side_effect = lambda refids, batch_size, use_cache, workers: {
+            refid: (unchanged.title if refid == unchanged.refid else "new title", "", "", "", False, False)
+            for refid in refids}
+        with patch('package_review.models.Package.objects.bulk_update') as mock_update:
+            refresh_package_data.Command().handle(workers=2)
+        mock_update.assert_called_once()
+        self.assertEqual([package.pk for package in mock_update.call_args[0][0]], [changed.pk])
+        self.assertEqual(mock_update.call_args[0][1], ['title'])
+
+        refresh_package_data.Command().handle()
+        changed.refresh_from_db()
+        self.assertEqual(changed.title, "new title")
+        self.assertEqual(mock_data.call_count, 2)
+
+
+class QCCheckTests(TestCase):
+
+    expectations = {
+        'min_dpi': {'expected': 400, 'level': 'fail'},
+        'min_long_edge': {'expected': None, 'level': 'warn'},
+        'bit_depths': {'expected': [8, 16], 'level': 'fail'},
+        'compressions': {'expected': ['raw'], 'level': 'warn'},
+        'icc_profile': {'expected': True, 'level': 'warn'},
+    }
+
+    def test_get_technical_metadata(self):
+        source = Path("package_review", FIXTURE_DIR, "packages", "9ba10e5461d401517b0e1a53d514ec87", "master", "9ba10e5461d401517b0e1a53d514ec87_0001.tif")
+        with patch('PIL.TiffImagePlugin.TiffImageFile.load') as mock_load:
+            metadata = get_technical_metadata(source)
+            mock_load.assert_not_called()
+        self.assertEqual(metadata, {
+            'width': 640, 'height': 480, 'bit_depth': 8, 'samples_per_pixel': 1,
+            'dpi': [72.0, 72.0], 'compression': 'packbits', 'icc_profile': None})
+
+    def test_check_metadata(self):
+        metadata = {
+            'width': 6000, 'height': 4000, 'bit_depth': 16, 'samples_per_pixel': 3,
+            'dpi': [600.0, 600.0], 'compression': 'raw', 'icc_profile': 'Adobe RGB (1998)'}
+        issues = check_metadata(metadata, self.expectations)
+        self.assertEqual(issues, [])
+        self.assertEqual(get_qc_status(issues), Package.QC_PASS)
+
+        issues = check_metadata(dict(metadata, compression='jpeg', icc_profile=None), self.expectations)
+        self.assertEqual([issue['check'] for issue in issues], ['compressions', 'icc_profile'])
+        self.assertEqual(get_qc_status(issues), Package.QC_WARN)
+
+        issues = check_metadata(dict(metadata, dpi=None, bit_depth=1), self.expectations)
+        self.assertEqual([issue['check'] for issue in issues], ['min_dpi', 'bit_depths'])
+        self.assertEqual(get_qc_status(issues), Package.QC_FAIL)
+
+        issues = check_metadata(metadata, dict(self.expectations, min_long_edge={'expected': 8000, 'level': 'warn'}))
+        self.assertEqual(issues[0]['message'], 'Long edge is 6000px, expected at least 8000px')
+
+    def test_unreadable_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.tif') as f:
+            f.write(b'not an image')
+            f.flush()
+            metadata, issues = check_file(f.name, self.expectations)
+        self.assertIsNone(metadata)
+        self.assertEqual(get_qc_status(issues), Package.QC_FAIL)
+
+
+class FixityTests(TestCase):
+
+    def setUp(self):
+        create_packages()
+        copy_binaries()
+        self.package = Package.objects.get(refid='f7d3dd6dc9c4732fa17dbd88fbe652b6')
+        create_package_files(self.package)
+
+    def tearDown(self):
+        for dir in Path(settings.BASE_STORAGE_DIR).iterdir():
+            shutil.rmtree(dir)
+
+    def test_get_checksums(self):
+        """Asserts files are hashed in chunks, and unreadable files are omitted."""
+        paths = [file.absolute_path for file in PackageFile.objects.order_by('pk')]
+        self.assertEqual(
+            get_checksum(paths[0], chunk_size=1000),
+            hashlib.sha256(paths[0].read_bytes()).hexdigest())
+        checksums = get_checksums(paths + [Path(settings.BASE_STORAGE_DIR, 'missing.tif')], workers=2)
+        self.assertEqual(checksums, {path: hashlib.sha256(path.read_bytes()).hexdigest() for path in paths})
+
+    def test_check_fixity(self):
+        """Asserts checksums are recorded, and changed or missing files are flagged."""
+        check_fixity.Command().handle()
+        files = list(PackageFile.objects.order_by('path'))
+        self.assertTrue(all(file.checksum for file in files))
+        self.assertEqual(Package.objects.get(pk=self.package.pk).qc_status, Package.QC_UNCHECKED)
+        with patch('package_review.fixity.get_checksum') as mock_checksum:
+            check_fixity.Command().handle()
+            mock_checksum.assert_not_called()
+
+        files[0].absolute_path.write_bytes(b'changed')
+        files[1].absolute_path.unlink()
+        check_fixity.Command().handle()
+        self.assertEqual(PackageFile.objects.get(pk=files[0].pk).qc_issues[0]['message'], 'File has changed since it was discovered')
+        self.assertEqual(PackageFile.objects.get(pk=files[1].pk).qc_issues[0]['message'], 'File is missing or unreadable')
+        self.assertEqual(PackageFile.objects.get(pk=files[2].pk).qc_issues, [])
+        self.assertEqual(Package.objects.get(pk=self.package.pk).qc_status, Package.QC_FAIL)
+
+        with patch('package_review.fixity.get_checksum', wraps=get_checksum) as mock_checksum:
+            check_fixity.Command().handle()
+            mock_checksum.assert_called_once()
+            self.assertEqual(mock_checksum.call_args[0][0], files[1].absolute_path)
+        self.assertEqual(len(PackageFile.objects.get(pk=files[0].pk).qc_issues), 1)
+        self.assertEqual(len(PackageFile.objects.get(pk=files[1].pk).qc_issues), 1)
+
+    def test_check_fixity_replaced(self):
+        """Asserts files replaced with the same size and modification time are hashed again."""
+        check_fixity.Command().handle()
+        file = PackageFile.objects.order_by('path').first()
+        file_stat = file.absolute_path.stat()
+        replacement = file.absolute_path.with_name('replacement')
+        replacement.write_bytes(b'x' * file_stat.st_size)
+        os.utime(replacement, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns))
+        replacement.replace(file.absolute_path)
+        check_fixity.Command().handle()
+        self.assertEqual(PackageFile.objects.get(pk=file.pk).qc_issues[0]['message'], 'File has changed since it was discovered')
+
+    def test_check_fixity_changed_before_first_check(self):
+        """Asserts files which changed between discovery and their first checksum are flagged."""
+        file = PackageFile.objects.order_by('path').first()
+        file.absolute_path.write_bytes(b'changed')
+        check_fixity.Command().handle()
+        self.assertEqual(PackageFile.objects.get(pk=file.pk).qc_issues[0]['message'], 'File has changed since it was discovered')
+
+    def test_unedited_files(self):
+        check_fixity.Command().handle()
+        response = self.client.get(reverse('package-detail', args=[self.package.pk]))
+        self.assertEqual(
+            [file.path for file in response.context['unedited_files']],
+            [file.path for file in PackageFile.objects.filter(role=PackageFile.MASTER_EDITED).order_by('path')])
+
+
+class ImageAnalysisTests(TestCase):
+
+    def setUp(self):
+        create_packages()
+        copy_binaries()
+        self.package = Package.objects.get(refid='f7d3dd6dc9c4732fa17dbd88fbe652b6')
+        create_package_files(self.package)
+
+    def tearDown(self):
+        for dir in Path(settings.BASE_STORAGE_DIR).iterdir():
+            shutil.rmtree(dir)
+
+    def test_get_page_statistics(self):
+        pages = [np.full((10, 10), 255, np.uint8), np.zeros((5, 4), np.uint8), np.array([[100, 110], [120, 130]], np.uint8)]
+        statistics = get_page_statistics(pages)
+        self.assertEqual(statistics[0], {'mean': 255.0, 'std': 0.0, 'black_clipping': 0.0, 'white_clipping': 100.0})
+        self.assertEqual(statistics[1], {'mean': 0.0, 'std': 0.0, 'black_clipping': 100.0, 'white_clipping': 0.0})
+        self.assertEqual(statistics[2]['mean'], 115.0)
+        self.assertAlmostEqual(statistics[2]['std'], np.array([100, 110, 120, 130]).std(), places=2)
+
+    def test_estimate_skew(self):
+        """Asserts skew of lines of text is detected, and pages without content are ignored."""
+        image = Image.new('L', (1200, 1600), 240)
+        draw = ImageDraw.Draw(image)
+        for y in range(100, 1500, 40):
+            draw.rectangle([100, y, 1100, y + 8], fill=20)
+        for angle in [0, 2, -3]:
+            page = image.rotate(angle, fillcolor=240, resample=Image.Resampling.BICUBIC)
+            page.thumbnail((512, 512))
+            self.assertEqual(abs(estimate_skew(np.asarray(page))), abs(angle))
+        self.assertIsNone(estimate_skew(np.full((512, 384), 240, np.uint8)))
+
+    @override_settings(IMAGE_ANALYSIS=dict(settings.IMAGE_ANALYSIS, batch_size=1))
+    def test_analyse_images(self):
+        """Asserts master edited images are analysed once, and flagged pages are shown on the detail page."""
+        response = self.client.get(reverse('package-detail', args=[self.package.pk]))
+        self.assertEqual((response.context['analysed_count'], response.context['page_count']), (0, 2))
+
+        analyse_images.Command().handle(workers=2)
+        files = list(self.package.files.filter(role=PackageFile.MASTER_EDITED).order_by('path'))
+        self.assertTrue(all(file.analysis and file.analysis['fingerprint'] for file in files))
+        with patch('package_review.analysis.analyse_batch') as mock_analyse:
+            analyse_images.Command().handle(workers=2)
+            mock_analyse.assert_not_called()
+
+        os.utime(files[0].absolute_path, ns=(0, 0))
+        with patch('package_review.analysis.ProcessPoolExecutor') as mock_executor:
+            mock_executor.return_value.__enter__.return_value.map.return_value = [[files[0].analysis]]
+            analyse_images.Command().handle(workers=2)
+            self.assertEqual(mock_executor.return_value.__enter__.return_value.map.call_args[0][1], [[files[0].absolute_path]])
+
+        PackageFile.objects.filter(pk=files[0].pk).update(analysis={'mean': 200.0, 'std': 50.0, 'black_clipping': 0.0, 'white_clipping': 0.0, 'skew': 0.0})
+        PackageFile.objects.filter(pk=files[1].pk).update(analysis={'mean': 250.0, 'std': 1.0, 'black_clipping': 0.0, 'white_clipping': 0.0, 'skew': None})
+        response = self.client.get(reverse('package-detail', args=[self.package.pk]))
+        self.assertEqual(response.context['analysed_count'], 2)
+        self.assertEqual(response.context['suspect_pages'], [(2, files[1], ['Blank page'])])
+        self.assertContains(response, reverse('file-zoom', args=[files[1].pk]))
+
+    def test_get_flags(self):
+        result = {'mean': 250.0, 'std': 1.0, 'black_clipping': 0.0, 'white_clipping': 80.0, 'skew': -2.5}
+        self.assertEqual(get_flags(result), ['Blank page', 'Skewed by 2.5°', '80% of pixels clipped to white'])
+        self.assertEqual(get_flags(dict(result, mean=10.0, white_clipping=0.0, skew=None)), ['Near-black page'])
+        self.assertEqual(get_flags(dict(result, std=50.0, white_clipping=0.0, skew=0.25)), [])
+
+
+class ThumbnailTests(TestCase):
+
+    def setUp(self):
+        create_packages()
+        copy_binaries()
+        self.cache_dir = Path(tempfile.mkdtemp())
+        self.override = override_settings(
+            THUMBNAILS={'cache_dir': self.cache_dir, 'size': 100, 'max_cache_size': 1024 ** 3},
+            TILES={'cache_dir': Path(self.cache_dir, 'tiles'), 'tile_size': 256, 'max_cache_size': 1024 ** 3})
+        self.override.enable()
+        self.package = Package.objects.get(refid='f7d3dd6dc9c4732fa17dbd88fbe652b6')
+        create_package_files(self.package)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.cache_dir)
+        for dir in Path(settings.BASE_STORAGE_DIR).iterdir():
+            shutil.rmtree(dir)
+
+    def test_get_thumbnail(self):
+        """Asserts thumbnails are downscaled, cached and regenerated when the source changes."""
+        source = PackageFile.objects.filter(package=self.package).first().absolute_path
+        thumbnail = get_thumbnail(source)
+        with Image.open(thumbnail) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (100, 75))
+        with patch('package_review.images.Image.open') as mock_open:
+            self.assertEqual(get_thumbnail(source), thumbnail)
+            mock_open.assert_not_called()
+        os.utime(source, ns=(0, 0))
+        self.assertNotEqual(get_thumbnail(source), thumbnail)
+
+    def test_get_thumbnail_concurrent(self):
+        """Asserts threads generating the same thumbnail do not share temporary files."""
+        source = PackageFile.objects.filter(package=self.package).first().absolute_path
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            thumbnails = list(executor.map(get_thumbnail, [source] * 8))
+        self.assertEqual(len(set(thumbnails)), 1)
+        with Image.open(thumbnails[0]) as image:
+            self.assertEqual(image.size, (100, 75))
+        self.assertEqual(list(self.cache_dir.rglob('*.tmp')), [])
+
+    def test_evict_cache(self):
+        """Asserts least recently used thumbnails are evicted first."""
+        thumbnails = [get_thumbnail(file.absolute_path) for file in PackageFile.objects.order_by('pk')]
+        for idx, thumbnail in enumerate(thumbnails):
+            os.utime(thumbnail, (idx, idx))
+        max_size = sum(thumbnail.stat().st_size for thumbnail in thumbnails[2:])
+        self.assertEqual(evict_cache(self.cache_dir, max_size), 2)
+        self.assertEqual([thumbnail.exists() for thumbnail in thumbnails], [False, False, True, True])
+
+    def test_thumbnail_view(self):
+        file = PackageFile.objects.first()
+        response = self.client.get(reverse('file-thumbnail', args=[file.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(len(list(self.cache_dir.rglob('*.jpg'))), 1)
+
+        response = self.client.get(reverse('package-detail', args=[self.package.pk]))
+        self.assertEqual(len(response.context['images']), 4)
+        self.assertEqual(response.context['images'][0].role, PackageFile.MASTER_EDITED)
+
+        shutil.rmtree(Path(settings.BASE_STORAGE_DIR, self.package.refid))
+        response = self.client.get(reverse('file-thumbnail', args=[file.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_get_pyramid(self):
+        """Asserts tile pyramids contain every level and are evicted whole."""
+        source = PackageFile.objects.first().absolute_path
+        pyramid = get_pyramid(source)
+        info = json.loads(Path(pyramid, 'info.json').read_text())
+        self.assertEqual(info, {'width': 640, 'height': 480, 'tile_size': 256, 'max_level': 10})
+        self.assertEqual(len(list(Path(pyramid, '10').iterdir())), 6)
+        self.assertEqual(len(list(Path(pyramid, '9').iterdir())), 2)
+        self.assertEqual(len(list(Path(pyramid, '0').iterdir())), 1)
+        with Image.open(get_tile(source, 10, 2, 1)) as tile:
+            self.assertEqual(tile.size, (128, 224))
+        self.assertIsNone(get_tile(source, 10, 3, 0))
+        self.assertEqual(evict_cache(Path(self.cache_dir, 'tiles'), 0), 1)
+        self.assertFalse(pyramid.exists())
+        self.assertEqual(list(Path(self.cache_dir, 'tiles').glob('*/*')), [])
+
+    def test_get_pyramid_concurrent(self):
+        """Asserts concurrent requests for the same pyramid build it only once."""
+        source = PackageFile.objects.first().absolute_path
+        with patch('package_review.images.to_8bit', wraps=to_8bit) as mock_to_8bit:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                pyramids = list(executor.map(get_pyramid, [source] * 4))
+        self.assertEqual(mock_to_8bit.call_count, 1)
+        self.assertEqual(len(set(pyramids)), 1)
+        self.assertTrue(Path(pyramids[0], 'info.json').is_file())
+        self.assertEqual([path for path in pyramids[0].parent.iterdir() if path.name.endswith('.tmp')], [])
+
+    def test_tile_view(self):
+        file = PackageFile.objects.first()
+        response = self.client.get(reverse('file-zoom', args=[file.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['pyramid'])
+        self.assertFalse(Path(self.cache_dir, 'tiles').exists())
+        response = self.client.get(reverse('file-tile', args=[file.pk, 10, 0, 0]))
+        self.assertEqual(response.status_code, 404)
+
+        get_pyramid(file.absolute_path)
+        response = self.client.get(reverse('file-zoom', args=[file.pk]))
+        self.assertEqual(response.context['pyramid']['max_level'], 10)
+        response = self.client.get(reverse('file-tile', args=[file.pk, 10, 0, 0]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        response = self.client.get(reverse('file-tile', args=[file.pk, 10, 5, 5]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_generate_thumbnails(self):
+        generate_thumbnails.Command().handle(workers=2)
+        self.assertEqual(len(list(self.cache_dir.glob('??/*.jpg'))), 4)
+        pyramids = list(Path(self.cache_dir, 'tiles').glob('*/*-256'))
+        self.assertEqual(len(pyramids), 4)
+        self.assertTrue(all(Path(pyramid, 'info.json').is_file() for pyramid in pyramids))
+
+
+class PackageMediaViewTests(TestCase):
+
+    def setUp(self):
+        create_packages()
+        copy_binaries()
+        self.refid = '9ba10e5461d401517b0e1a53d514ec87'
+        self.path = 'master/9ba10e5461d401517b0e1a53d514ec87_0001.tif'
+        self.url = reverse('package-media', args=[self.refid, self.path])
+        self.content = Path(settings.BASE_STORAGE_DIR, self.refid, self.path).read_bytes()
+
+    def tearDown(self):
+        for dir in Path(settings.BASE_STORAGE_DIR).iterdir():
+            shutil.rmtree(dir)
+
+    def test_parse_range_header(self):
+        for header, expected in [
+                ('bytes=0-9', (0, 9)),
+                ('bytes=10-', (10, 99)),
+                ('bytes=-10', (90, 99)),
+                ('bytes=90-200', (90, 99)),
+                ('bytes=0-9,20-29', None),
+                ('bytes=9-0', None),
+                ('lines=0-9', None),
+                (None, None)]:
+            self.assertEqual(parse_range_header(header, 100), expected, header)
+        for header in ['bytes=100-', 'bytes=-0']:
+            with self.assertRaises(ValueError):
+                parse_range_header(header, 100)
+
+    @override_settings(MEDIA_SENDFILE_HEADER=None)
+    def test_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        etag = response['ETag']
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-19', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(self.content)}-'})
+        self.assertEqual(response.status_code, 416)
+
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Sendfile')
+    def test_sendfile(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Sendfile'], str(Path(settings.BASE_STORAGE_DIR, self.refid, self.path)))
+        self.assertEqual(response.content, b'')
+
+    def test_not_found(self):
+        for refid, path in [
+                ('f7d3dd6dc9c4732fa17dbd88fbe652b6', '../9ba10e5461d401517b0e1a53d514ec87/' + self.path),
+                (self.refid, 'master/missing.tif'),
+                ('a' * 32, self.path)]:
+            response = self.client.get(reverse('package-media', args=[refid, path]))
+            self.assertEqual(response.status_code, 404, path)
+
 
 class HealthCheckEndpointTests(TestCase):
 
@@ -1,14 +1,26 @@
+import json
+import mimetypes
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from os import getenv
 from pathlib import Path
-from shutil import rmtree
 
 from django.conf import settings
+from django.contrib import messages
+from django.db import transaction
+from django.db.models import Q
+from django.http import (FileResponse, Http404, HttpResponse, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
 from django.views.generic import DetailView, ListView, TemplateView, View
 
-from .clients import ArchivesSpaceClient, AWSClient
-from .helpers import get_config
-from .models import Package, RightsStatement
+from .analysis import get_analysis
+from .clients import ArchivesSpaceClient
+from .helpers import get_config, parse_range_header, refresh_package_data
+from .images import get_pyramid, get_thumbnail, get_tile, is_image
+from .models import Job, Package, PackageFile, RightsStatement
 
 
 class RightsStatementMixin(View):
@@ -22,10 +34,96 @@ class RightsStatementMixin(View):
 
 
 class PackageListView(ListView):
-    """List view for packages waiting to be reviewed."""
+    """List view for packages waiting to be reviewed.
+
+    Packages are sorted on the server and paginated using a cursor containing
+    the sort value and primary key of the first or last package on a page, so
+    each page is a single indexed range query regardless of its position.
+    """
     template_name = 'list.html'
     model = Package
-    queryset = Package.objects.filter(process_status=Package.PENDING)
+    page_size = 50
+    sort_headers = [
+        ('title', 'Title'),
+        ('resource_title', 'Collection'),
+        ('undated_object', 'Undated Object?'),
+        ('already_digitized', 'Already Digitized?'),
+        ('qc_status', 'QC Checks')]
+    sort_types = {
+        'title': str,
+        'resource_title': str,
+        'undated_object': bool,
+        'already_digitized': bool,
+        'qc_status': int}
+
+    def _encode_cursor(self, package, field):
+        return urlsafe_b64encode(json.dumps([getattr(package, field), package.pk]).encode()).decode()
+
+    def _decode_cursor(self, cursor, field):
+        """Returns the sort value and primary key in a cursor, or None if it is malformed or does not match the sort field."""
+        try:
+            value, pk = json.loads(urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            return None
+        if type(value) is not self.sort_types[field] or type(pk) is not int:
+            return None
+        return value, pk
+
+    def get_sort(self):
+        """Returns the requested sort, defaulting to title."""
+        sort = self.request.GET.get('sort', 'title')
+        return sort if sort.lstrip('-') in dict(self.sort_headers) else 'title'
+
+    def get_queryset(self):
+        """Returns a page of pending packages which are not part of a queued or running job.
+
+        Packages are filtered by search query, which matches case-insensitive
+        substrings of title, collection title and RefID. On PostgreSQL these
+        searches are backed by trigram indexes.
+        """
+        queryset = (
+            Package.objects
+            .filter(process_status=Package.PENDING)
+            .filter(active_job__isnull=True)
+            .only('title', 'resource_title', 'undated_object', 'already_digitized', 'qc_status'))
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            queryset = queryset.filter(Q(title__icontains=query) | Q(resource_title__icontains=query) | Q(refid__icontains=query))
+
+        sort = self.get_sort()
+        field = sort.lstrip('-')
+        after = self._decode_cursor(self.request.GET.get('after', ''), field)
+        before = None if after else self._decode_cursor(self.request.GET.get('before', ''), field)
+        descending = sort.startswith('-') != bool(before)
+        cursor = after or before
+        if cursor:
+            value, pk = cursor
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'pk__{lookup}': pk}))
+        ordering = [f'-{field}', '-pk'] if descending else [field, 'pk']
+        page = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if before:
+            page.reverse()
+
+        self.next_cursor = self._encode_cursor(page[-1], field) if page and (has_more or before) else None
+        self.previous_cursor = self._encode_cursor(page[0], field) if page and ((before and has_more) or after) else None
+        return page
+
+    def get_context_data(self, **kwargs):
+        """Adds search query, sort, pagination cursors, active jobs, and any job requested in URL parameters, to context."""
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '').strip()
+        context['sort'] = self.get_sort()
+        context['sort_headers'] = self.sort_headers
+        context['next_cursor'] = self.next_cursor
+        context['previous_cursor'] = self.previous_cursor
+        jobs = Job.objects.filter(status__in=[Job.QUEUED, Job.RUNNING])
+        if self.request.GET.get('job', '').isdigit():
+            jobs = jobs | Job.objects.filter(pk=self.request.GET['job'])
+        context['jobs'] = jobs.distinct().order_by('pk')
+        return context
 
 
 class PackageDetailView(RightsStatementMixin, DetailView):
@@ -33,6 +131,147 @@ class PackageDetailView(RightsStatementMixin, DetailView):
     template_name = 'detail.html'
     model = Package
 
+    def get_context_data(self, **kwargs):
+        """Adds images for the contact sheet, files with QC issues, unedited master edited files and pages flagged by image analysis to context."""
+        context = super().get_context_data(**kwargs)
+        files = self.object.files.filter(role__in=[PackageFile.MASTER_EDITED, PackageFile.MASTER]).order_by('-role', 'path')
+        context['images'] = [file for file in files if is_image(file.path)]
+        context['qc_files'] = self.object.files.exclude(qc_issues=[]).order_by('path')
+        master_checksums = {Path(file.path).name: file.checksum for file in context['images'] if file.role == PackageFile.MASTER and file.checksum}
+        context['unedited_files'] = [
+            file for file in context['images']
+            if file.role == PackageFile.MASTER_EDITED and file.checksum and master_checksums.get(Path(file.path).name) == file.checksum]
+        pages = [file for file in context['images'] if file.role == PackageFile.MASTER_EDITED]
+        analysis = get_analysis(pages)
+        context['page_count'] = len(pages)
+        context['analysed_count'] = len(analysis)
+        context['suspect_pages'] = [
+            (number, file, analysis[file]['flags']) for number, file in enumerate(pages, start=1)
+            if file in analysis and analysis[file]['flags']]
+        return context
+
+
+class PackageImageMixin(DetailView):
+    """Base view for images within a package."""
+    model = PackageFile
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('package')
+
+    def get_source(self):
+        """Returns the path to the image, raising a 404 if it is not an image or no longer exists."""
+        source = self.object.absolute_path
+        if not (is_image(source) and source.is_file()):
+            raise Http404('Image not found')
+        return source
+
+
+class PackageFileThumbnailView(PackageImageMixin):
+    """Returns a cached JPEG thumbnail of an image in a package."""
+
+    def render_to_response(self, context, **response_kwargs):
+        response = FileResponse(open(get_thumbnail(self.get_source()), 'rb'), content_type='image/jpeg')
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
+
+class PackageFileZoomView(PackageImageMixin):
+    """Zoomable viewer for an image in a package."""
+    template_name = 'zoom.html'
+
+    def get_context_data(self, **kwargs):
+        """Adds the dimensions of the image's tile pyramid to context, or None if it has not been built yet.
+
+        Pyramids are built in the background by the `generate_thumbnails` command.
+        """
+        context = super().get_context_data(**kwargs)
+        pyramid_path = get_pyramid(self.get_source(), build=False)
+        context['pyramid'] = json.loads(Path(pyramid_path, 'info.json').read_text()) if pyramid_path else None
+        return context
+
+
+class PackageFileTileView(PackageImageMixin):
+    """Returns a single JPEG tile from an image's tile pyramid."""
+
+    def render_to_response(self, context, **response_kwargs):
+        tile_path = get_tile(self.get_source(), self.kwargs['level'], self.kwargs['column'], self.kwargs['row'])
+        if not tile_path:
+            raise Http404('Tile not found')
+        response = FileResponse(open(tile_path, 'rb'), content_type='image/jpeg')
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
+
+class PackageMediaView(View):
+    """Serves files in a package's storage directory.
+
+    Files are only served for known packages, and requests for paths outside a
+    package directory are refused. ETag and Last-Modified headers allow clients
+    to revalidate cached copies. When `settings.MEDIA_SENDFILE_HEADER` is set,
+    delivery (including byte ranges) is handed to the web server; otherwise
+    single byte ranges are served directly.
+    """
+    chunk_size = 64 * 1024
+
+    def get_path(self, refid, path):
+        """Returns the absolute path of a file within a package, raising a 404 if it is not available."""
+        if not Package.objects.filter(refid=refid).exists():
+            raise Http404('Package not found')
+        package_dir = Path(settings.BASE_STORAGE_DIR, refid)
+        file_path = Path(package_dir, path)
+        if '..' in Path(path).parts or not file_path.resolve().is_relative_to(package_dir.resolve()) or not file_path.is_file():
+            raise Http404('File not found')
+        return file_path
+
+    def _read_range(self, file_path, start, length):
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            while length > 0:
+                chunk = f.read(min(self.chunk_size, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                yield chunk
+
+    def get(self, request, refid, path, *args, **kwargs):
+        file_path = self.get_path(refid, path)
+        stat = file_path.stat()
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        last_modified = int(stat.st_mtime)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not response:
+            if settings.MEDIA_SENDFILE_HEADER:
+                response = HttpResponse(content_type=mimetypes.guess_type(file_path)[0] or 'application/octet-stream')
+                response[settings.MEDIA_SENDFILE_HEADER] = str(file_path)
+            else:
+                response = self.get_file_response(request, file_path, stat.st_size, etag, last_modified)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Accept-Ranges'] = 'bytes'
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def get_file_response(self, request, file_path, size, etag, last_modified):
+        """Returns the whole file, or the single byte range requested in the Range header."""
+        if_range = request.headers.get('If-Range')
+        if not if_range or if_range == etag or parse_http_date_safe(if_range) == last_modified:
+            try:
+                byte_range = parse_range_header(request.headers.get('Range'), size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+            if byte_range:
+                start, end = byte_range
+                response = StreamingHttpResponse(
+                    self._read_range(file_path, start, end - start + 1),
+                    status=206,
+                    content_type=mimetypes.guess_type(file_path)[0] or 'application/octet-stream')
+                response['Content-Length'] = end - start + 1
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+                return response
+        return FileResponse(open(file_path, 'rb'))
+
 
 class BulkActionListView(View):
     """List page for items on which bulk action will be taken."""
@@ -64,70 +303,98 @@ class PackageActionView(View):
         return Package.objects.filter(pk__in=object_ids)
 
 
-class PackageApproveView(PackageActionView):
-    """Approves a list of packages."""
-    message = 'Package reviewed and approved.'
-    outcome = 'SUCCESS'
+class PackageJobView(PackageActionView):
+    """Queues a job to approve or reject a list of packages."""
+    action = None
+
+    def get_rights_ids(self, request):
+        return None
 
     def post(self, request, *args, **kwargs):
-        queryset = self._get_queryset(request)
-        rights_ids = request.GET['rights_ids']
-        aws_client = AWSClient('sns', settings.AWS['role_arn'])
-        for package in queryset:
-            aws_client.deliver_message(
-                settings.AWS['sns_topic'],
-                package,
-                self.message,
-                self.outcome,
-                rights_ids=rights_ids)
-            package.process_status = Package.APPROVED
-            package.rights_ids = rights_ids
-            package.save()
-        return redirect('package-list')
+        """Queues a job for selected packages which are pending and not claimed by another active job.
+
+        The selected packages are locked and claimed by setting their active job
+        in the same transaction. A reviewer acting on the same packages at the
+        same time waits for the lock, then sees the claim and skips them.
+        """
+        with transaction.atomic():
+            packages = list(
+                self._get_queryset(request)
+                .select_for_update()
+                .filter(process_status=Package.PENDING, active_job__isnull=True))
+            if not packages:
+                messages.error(request, 'The selected packages have already been approved or rejected.')
+                return redirect('package-list')
+            job = Job.objects.create(action=self.action, rights_ids=self.get_rights_ids(request))
+            job.packages.set(packages)
+            Package.objects.filter(pk__in=[package.pk for package in packages]).update(active_job=job)
+        messages.info(request, f'{job.get_action_display()} of {len(packages)} packages queued.')
+        return redirect(f"{reverse('package-list')}?job={job.pk}")
+
 
+class PackageApproveView(PackageJobView):
+    """Approves a list of packages."""
+    action = Job.APPROVE
+
+    def get_rights_ids(self, request):
+        return request.GET['rights_ids']
 
-class PackageRejectView(PackageActionView):
+
+class PackageRejectView(PackageJobView):
     """Rejects a list of packages."""
-    message = 'Package reviewed and rejected.'
-    outcome = 'FAILURE'
+    action = Job.REJECT
 
-    def post(self, request, *args, **kwargs):
-        queryset = self._get_queryset(request)
-        aws_client = AWSClient('sns', settings.AWS['role_arn'])
-        for package in queryset:
-            self.delete_files(package)
-            aws_client.deliver_message(
-                settings.AWS['sns_topic'],
-                package,
-                self.message,
-                self.outcome)
-            package.process_status = Package.REJECTED
-            package.save()
-        return redirect('package-list')
 
-    def delete_files(self, package):
-        """Removes files from storage directory."""
-        bag_dir = Path(settings.BASE_STORAGE_DIR, package.refid)
-        if bag_dir.exists():
-            rmtree(bag_dir)
+class JobDetailView(DetailView):
+    """Returns the progress of a job as JSON."""
+    model = Job
 
+    def render_to_response(self, context, **response_kwargs):
+        job = self.object
+        return JsonResponse({
+            'status': job.get_status_display(),
+            'active': job.is_active,
+            'processed': job.processed_count,
+            'total': job.packages.count(),
+            'errors': job.errors,
+        })
 
-class PackageDataRefreshView(PackageActionView):
-    def get(self, request, *args, **kwargs):
-        queryset = self._get_queryset(request)
+
+class PackageDataRefreshMixin(View):
+    """Refreshes ArchivesSpace data for a list of packages."""
+
+    def refresh(self, request, queryset):
+        """Refreshes data for packages, adding messages about any errors."""
         configuration = get_config(f"/{getenv('ENV')}/{getenv('APP_CONFIG_PATH')}")
         client = ArchivesSpaceClient(
             baseurl=configuration.get('AS_BASEURL'),
             username=configuration.get('AS_USERNAME'),
             password=configuration.get('AS_PASSWORD'),
             repository=configuration.get('AS_REPO'))
-        for package in queryset:
-            title, uri, resource_title, resource_uri, undated_object, already_digitized = client.get_package_data(package.refid)
-            package.title = title
-            package.uri = uri
-            package.resource_title = resource_title
-            package.resource_uri = resource_uri
-            package.undated_object = undated_object
-            package.already_digitized = already_digitized
-            package.save()
+        updated, errors = refresh_package_data(client, queryset)
+        for refid, error in errors.items():
+            messages.error(request, f'Unable to refresh data for {refid}: {error}')
+        return updated, errors
+
+
+class PackageDataRefreshView(PackageDataRefreshMixin, PackageActionView):
+    """Refreshes ArchivesSpace data for a package and redirects to its detail page."""
+
+    def get(self, request, *args, **kwargs):
+        queryset = self._get_queryset(request)
+        package = queryset.last()
+        if not package:
+            raise Http404('Package not found')
+        self.refresh(request, queryset)
         return redirect('package-detail', pk=package.pk)
+
+
+class PackageBulkRefreshView(PackageDataRefreshMixin):
+    """Refreshes ArchivesSpace data for packages selected in the list view."""
+
+    def get(self, request, *args, **kwargs):
+        object_ids = [int(k) for k in request.GET]
+        queryset = Package.objects.filter(pk__in=object_ids)
+        updated, errors = self.refresh(request, queryset)
+        messages.info(request, f'Refreshed ArchivesSpace data for {len(queryset) - len(errors)} packages, of which {len(updated)} changed.')
+        return redirect('package-list')